@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+import sys
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+
+from nicFWutil import (NicFWError, calc_checksum, parse_keys,
+    CMD_START_REMOTE_SESSION, CMD_END_REMOTE_SESSION, CMD_READ_EEPROM, CMD_WRITE_EEPROM, CMD_READ_BATTERY_ADC,
+    CMD_DISABLE_RADIO, CMD_ENABLE_RADIO, CMD_FLASHLIGHT_ON, CMD_FLASHLIGHT_OFF, CMD_RESET_RADIO, CMD_RESPONSE_LEN,
+    DEFAULT_SERIAL_TIMEOUT, DEFAULT_KEY_PUSH_TIME, EEPROM_BLOCK_SIZE)
+
+# asyncio transport for nicFW radios
+# - serial device is read by event loop (add_reader on its file descriptor), so one loop
+#   can drive many radios at once and slow/unresponsive radio doesn't block others
+# - commands, ACKs and checksums are the same as in nicFWutil.py
+#
+#   import asyncio, nicFWasync
+#
+#   async def main():
+#       async with nicFWasync.AsyncRadio("/dev/ttyUSB0") as radio:
+#           async with radio.session():
+#               data = await radio.get_eeprom_block(2)
+#           print(await radio.read_battery_adc())
+#
+#   asyncio.run(main())
+
+DEFAULT_POLL_INTERVAL = 5           # seconds between battery reads in poll mode
+
+debug = False
+
+
+class AsyncRadio:
+
+    def __init__(self, device, timeout=DEFAULT_SERIAL_TIMEOUT):
+
+        self.device = device
+        self.timeout = timeout          # time to wait for radio response
+
+        self.port = None
+        self.session_depth = 0          # number of currently opened (nested) radio sessions
+        self._reader = None             # StreamReader fed by event loop with bytes from serial device
+        self._lock = None               # one request/response exchange at a time
+        self._received = 0              # number of bytes received from serial device
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def open(self):
+
+        import serial
+
+        if debug:
+            print("[DBG] Using '{}' device...".format(self.device))
+
+        # non blocking port, reads are done only when event loop reports data
+        try:
+            self.port = serial.Serial(self.device, baudrate=38400, timeout=0)
+        except serial.serialutil.SerialException:
+            raise NicFWError("problem occured when trying to open '{}' device".format(self.device))
+
+        self._reader = asyncio.StreamReader()
+        self._lock = asyncio.Lock()
+
+        asyncio.get_running_loop().add_reader(self.port.fileno(), self._on_readable)
+
+    def close(self):
+
+        if self.port is not None:
+            asyncio.get_running_loop().remove_reader(self.port.fileno())
+            self.port.close()
+            self.port = None
+
+    # called by event loop when serial device has data
+    def _on_readable(self):
+        try:
+            data = self.port.read(max(1, self.port.in_waiting))
+        except OSError as e:
+            self._reader.set_exception(NicFWError("problem occured when reading '{}' device ({})".format(self.device, e)))
+            return
+        if data:
+            self._received += len(data)
+            self._reader.feed_data(data)
+
+    # drop buffered and late arriving bytes (eg. rest of response after timeout) until there
+    # is no input for timeout time, so the next command doesn't read them as its response
+    async def _drain(self):
+
+        while True:
+            self._reader = asyncio.StreamReader()
+            received = self._received
+            await asyncio.sleep(self.timeout)
+            if self._received == received:
+                break
+
+    async def _read(self, size):
+        try:
+            return await asyncio.wait_for(self._reader.readexactly(size), self.timeout)
+        except asyncio.TimeoutError:
+            await self._drain()
+            raise NicFWError("timeout while waiting for response from '{}' device".format(self.device))
+        except asyncio.IncompleteReadError:
+            raise NicFWError("'{}' device has been closed".format(self.device))
+
+    # send command with its arguments, returns response without ACK
+    # - response length and ACK are checked for commands listed in CMD_RESPONSE_LEN
+    async def command(self, cmd, args=b''):
+
+        response_len = CMD_RESPONSE_LEN.get(cmd[0], 0)
+
+        async with self._lock:
+
+            self.port.write(cmd + bytes(args))
+
+            if response_len == 0:
+                return b''
+
+            response = await self._read(response_len)
+
+        if response[0:1] != cmd:
+            raise NicFWError("Unable to communicate with nicFW -- there was no valid ACK for {} command ({} recaived).".format(cmd,response[0:1]))
+
+        return response[1:]
+
+    async def disable_radio(self):
+        await self.command(CMD_DISABLE_RADIO)
+
+    async def enable_radio(self):
+        await self.command(CMD_ENABLE_RADIO)
+
+    async def reset_radio(self):
+        await self.command(CMD_RESET_RADIO)
+
+    async def enable_remote(self):
+        await self.command(CMD_START_REMOTE_SESSION)
+
+    async def disable_remote(self):
+        await self.command(CMD_END_REMOTE_SESSION)
+
+    async def flashlight(self, on):
+        if on:
+            await self.command(CMD_FLASHLIGHT_ON)
+        else:
+            await self.command(CMD_FLASHLIGHT_OFF)
+
+    # push and release key (0-18), radio is not blocked between push and release
+    async def send_key(self, key, push_time=DEFAULT_KEY_PUSH_TIME):
+        await self.command(bytes([0x80|int(key)]))
+        await asyncio.sleep(push_time)
+        await self.command(bytes([0xFF]))
+        await asyncio.sleep(push_time)
+
+    # send coma separated key sequence (the same syntax as nicFWutil.py --key) in single remote session
+    async def send_keys(self, keys_str, push_time=DEFAULT_KEY_PUSH_TIME):
+        async with self.remote_session():
+            for key in parse_keys(keys_str):
+                await self.send_key(key, push_time)
+
+    # keep remote control session opened for the time of sending keys
+    @asynccontextmanager
+    async def remote_session(self):
+
+        await self.enable_remote()
+
+        try:
+            yield
+        except BaseException:
+            try:
+                await self.disable_remote()
+            except NicFWError as e:
+                print("[WARN] remote session could not be closed ({})".format(e), file=sys.stderr)
+            raise
+        await self.disable_remote()
+
+    # raw battery ADC value
+    async def read_battery_adc(self):
+        response = await self.command(CMD_READ_BATTERY_ADC)
+        return int.from_bytes(response, 'little')
+
+    # keep radio disabled for the time of EEPROM access, sessions can be nested
+    @asynccontextmanager
+    async def session(self):
+
+        if self.session_depth == 0:
+            await self.disable_radio()
+        self.session_depth += 1
+
+        try:
+            yield
+        finally:
+            self.session_depth -= 1
+            if self.session_depth == 0:
+                await self.enable_radio()
+
+    # get eeprom block (32 bytes)
+    async def get_eeprom_block(self, address):
+
+        response = await self.command(CMD_READ_EEPROM, [address])
+
+        data = response[:EEPROM_BLOCK_SIZE]
+        checksum_r = response[EEPROM_BLOCK_SIZE:]
+
+        if checksum_r != calc_checksum(data):
+            raise NicFWError("received data checksum mismatch!")
+
+        return data
+
+    # read chunk of consecutive eeprom blocks in single radio session
+    async def read_eeprom_blocks(self, start_address, nblocks):
+
+        data = bytearray()
+
+        async with self.session():
+            for address in range(start_address, start_address+nblocks):
+                data.extend(await self.get_eeprom_block(address))
+
+        return data
+
+    # write eeprom block (32 bytes)
+    async def write_eeprom_block(self, address, data_bytes):
+
+        if len(data_bytes) != EEPROM_BLOCK_SIZE:
+            raise NicFWError("block data has wrong size ({} but should be {} bytes).".format(len(data_bytes),EEPROM_BLOCK_SIZE))
+
+        async with self.session():
+            await self.command(CMD_WRITE_EEPROM, bytes([address]) + bytes(data_bytes) + calc_checksum(data_bytes))
+
+
+# read battery ADC of all radios every interval seconds, one event loop for all of them
+# - every radio is handled separately, radio which can't be opened is reported and opening
+#   is retried in the next round, the others are polled as usual
+async def poll_battery(devices, interval=DEFAULT_POLL_INTERVAL, count=None):
+
+    radios = [ AsyncRadio(device) for device in devices ]
+
+    async def poll(radio):
+        try:
+            if radio.port is None:
+                await radio.open()
+            value = await radio.read_battery_adc()
+            return "{}".format(value)
+        except NicFWError as e:
+            return "ERR ({})".format(e)
+
+    try:
+        n = 0
+        while count is None or n < count:
+            values = await asyncio.gather(*(poll(radio) for radio in radios))
+            print(' '.join("{}={}".format(radio.device, value) for radio, value in zip(radios, values)))
+            n += 1
+            if count is None or n < count:
+                await asyncio.sleep(interval)
+    finally:
+        for radio in radios:
+            radio.close()
+
+
+######################################################################################
+######################################################################################
+# MAIN
+######################################################################################
+######################################################################################
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="nicFW radios battery ADC polling over asyncio transport")
+    parser.add_argument("devices", nargs='+', help="serial devices to poll")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="seconds between reads (default 5)")
+    parser.add_argument("--count", type=int, help="number of reads (default infinite)")
+    parser.add_argument("--debug", action='store_true', help="enable debug messages")
+    args = parser.parse_args()
+
+    debug = args.debug
+
+    try:
+        asyncio.run(poll_battery(args.devices, args.interval, args.count))
+    except NicFWError as e:
+        print("[ERR] {}".format(e))
+        sys.exit(2)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from nicFWemu import RadioEmulator, DEFAULT_BAUDRATE, DEFAULT_TURNAROUND, DEFAULT_LATENCY, EEPROM_BLOCK_SIZE, EEPROM_BLOCKS
+
+# nicFWutil.py benchmark
+# - every scenario runs real nicFWutil.py command against fresh nicFWemu.py radio
+#   with realistic (38400 baud) line timing
+# - reports wall time split into phases (startup before first byte on the wire,
+#   serial I/O, shutdown after last byte), round trips and bytes on the wire as JSON
+
+NICFWUTIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nicFWutil.py")
+
+CHANNELS_COUNT = 198
+
+
+# build reproducible EEPROM image with 150 channels and valid settings regions
+def build_image():
+
+    image = bytearray([0]*EEPROM_BLOCKS*EEPROM_BLOCK_SIZE)
+
+    for number in range(1, CHANNELS_COUNT+1):
+
+        offset = (number+1)*EEPROM_BLOCK_SIZE
+
+        if number > 150:
+            image[offset:offset+EEPROM_BLOCK_SIZE] = bytes([255]*EEPROM_BLOCK_SIZE)
+            continue
+
+        freq = 43000000 + number*2500
+        name = "CH-{:03d}".format(number).encode().ljust(12, b'\0')
+        groups = bytes([number%15+1, 0])
+        mod_bw = 0b11111000 | (1<<1) | (number%2)
+
+        image[offset:offset+EEPROM_BLOCK_SIZE] = struct.pack("<IIHHB2sB4s12s", freq, freq, 0, 0, 127, groups, mod_bw, bytes([255]*4), name)
+
+    return image
+
+
+# scenarios: name, nicFWutil.py arguments, emulator image preparation
+# - {csv} is replaced by temporary CSV file name
+def erase_channels(image):
+    image[2*EEPROM_BLOCK_SIZE:(CHANNELS_COUNT+2)*EEPROM_BLOCK_SIZE] = bytes([255]*CHANNELS_COUNT*EEPROM_BLOCK_SIZE)
+
+SCENARIOS = [
+    ("read_channel",            ["-c", "12"],                   None),
+    ("export_csv",              ["--export-csv", "{csv}"],      None),
+    ("import_csv",              ["--import-csv", "{csv}"],      erase_channels),
+    ("import_csv_unchanged",    ["--import-csv", "{csv}"],      None),
+    ("show_eeprom",             ["--show-eeprom"],              None),
+    ("show_bandplan",           ["--show-bandplan"],            None),
+    ("show_fmtuner",            ["--show-fmtuner"],             None),
+    ("show_scan_presets",       ["--show-scan-presets"],        None),
+    ("key_sequence",            ["--key", "star,144.950,menu"], None),
+]
+
+
+# run single scenario, returns result dict
+# - phases and counters are taken from the fastest run (the one reported as wall_time)
+def run_scenario(name, cli_args, prepare, image, csv_file, settings, repeat):
+
+    runs = []
+
+    for i in range(repeat):
+
+        run_image = bytearray(image)
+        if prepare != None:
+            prepare(run_image)
+
+        emulator = RadioEmulator(
+            image=run_image,
+            baudrate=settings['baudrate'],
+            turnaround=settings['turnaround'],
+            latency=settings['latency']).start()
+
+        cmd = [sys.executable, NICFWUTIL, "-d", emulator.port_name]
+        cmd += [a.format(csv=csv_file) for a in cli_args]
+        cmd += settings['extra_args']
+
+        start = time.monotonic()
+        process = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        end = time.monotonic()
+
+        emulator.stop()
+
+        runs.append((end-start, start, end, dict(emulator.stats), process))
+
+    wall_times = [ run[0] for run in runs ]
+    wall_time, start, end, stats, process = min(runs, key=lambda run: run[0])
+
+    # phases of fastest run
+    if stats['first_byte'] is not None:
+        phases = {
+            'startup': stats['first_byte']-start,
+            'serial_io': stats['last_byte']-stats['first_byte'],
+            'shutdown': end-stats['last_byte'],
+        }
+    else:
+        phases = { 'startup': end-start, 'serial_io': 0.0, 'shutdown': 0.0 }
+
+    return {
+        'name': name,
+        'args': cli_args + settings['extra_args'],
+        'exit_code': process.returncode,
+        'wall_time': wall_time,
+        'wall_time_median': statistics.median(wall_times),
+        'phases': phases,
+        'round_trips': stats['round_trips'],
+        'bytes_sent': stats['bytes_in'],
+        'bytes_received': stats['bytes_out'],
+        'block_reads': stats['block_reads'],
+        'block_writes': stats['block_writes'],
+        'radio_disable': stats['disable'],
+        'radio_enable': stats['enable'],
+        'error': process.stderr.decode('utf-8', 'replace').strip(),
+    }
+
+
+######################################################################################
+######################################################################################
+# MAIN
+######################################################################################
+######################################################################################
+
+if __name__ == "__main__":
+
+    scenario_names = [ s[0] for s in SCENARIOS ]
+
+    parser = argparse.ArgumentParser(description="nicFWutil.py benchmark against emulated radio")
+    parser.add_argument("scenarios", nargs='*', help="scenarios to run (default all): {}".format(', '.join(scenario_names)))
+    parser.add_argument("--image", help="EEPROM image used by emulated radio (default generated one)")
+    parser.add_argument("--repeat", type=int, default=1, help="run each scenario N times, report fastest (default 1)")
+    parser.add_argument("--baudrate", type=int, default=DEFAULT_BAUDRATE, help="modeled line speed (default 38400)")
+    parser.add_argument("--turnaround", type=float, default=DEFAULT_TURNAROUND*1000, help="radio turnaround time in ms (default 1)")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY*1000, help="serial adapter latency in ms (default 4)")
+    parser.add_argument("--window", type=int, help="pass --window to nicFWutil.py for read scenarios")
+    parser.add_argument("-o", "--output", help="write JSON results to file instead of stdout")
+    args = parser.parse_args()
+
+    for name in args.scenarios:
+        if name not in scenario_names:
+            print("[ERR] unknown scenario '{}', allowed: {}".format(name, ', '.join(scenario_names)))
+            sys.exit(2)
+
+    if args.repeat < 1:
+        print("[ERR] repeat count should be at least 1.")
+        sys.exit(2)
+
+    if args.image != None:
+        try:
+            with open(args.image, "rb") as f:
+                image = f.read()
+        except OSError:
+            print("[ERR] Could not open/read image file '{}'".format(args.image))
+            sys.exit(2)
+        if len(image) != EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+            print("[ERR] image file '{}' has wrong size.".format(args.image))
+            sys.exit(2)
+    else:
+        image = build_image()
+
+    settings = {
+        'baudrate': args.baudrate,
+        'turnaround': args.turnaround/1000,
+        'latency': args.latency/1000,
+        'extra_args': [],
+    }
+
+    if args.window != None:
+        settings['extra_args'] = ["--window", str(args.window)]
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        csv_file = os.path.join(tmpdir, "channels.csv")
+
+        # import scenarios need CSV file, export it from emulated radio first
+        if any(s[0].startswith("import_csv") for s in SCENARIOS if not args.scenarios or s[0] in args.scenarios):
+            run_scenario("export_csv", ["--export-csv", "{csv}"], None, image, csv_file, dict(settings, extra_args=[], baudrate=0, turnaround=0, latency=0), 1)
+
+        for name, cli_args, prepare in SCENARIOS:
+
+            if args.scenarios and name not in args.scenarios:
+                continue
+
+            # --window affects only reads, keys don't use EEPROM at all
+            scenario_settings = settings
+            if name == "key_sequence":
+                scenario_settings = dict(settings, extra_args=[])
+
+            result = run_scenario(name, cli_args, prepare, image, csv_file, scenario_settings, args.repeat)
+            results.append(result)
+
+            print("{:22s} {:8.3f}s  {:5d} round trips  {:6d} bytes".format(
+                name, result['wall_time'], result['round_trips'], result['bytes_sent']+result['bytes_received']), file=sys.stderr)
+
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'settings': {
+            'baudrate': args.baudrate,
+            'turnaround_ms': args.turnaround,
+            'latency_ms': args.latency,
+            'window': args.window,
+            'repeat': args.repeat,
+            'image': args.image,
+        },
+        'results': results,
+    }
+
+    if args.output != None:
+        try:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        except OSError:
+            print("[ERR] Could not open/write file '{}'".format(args.output))
+            sys.exit(2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tty
+import time
+import queue
+import argparse
+import threading
+
+# nicFW radio emulator
+# - opens pseudo-terminal and speaks nicFW serial protocol on it, so nicFWutil.py
+#   can be run (and timed) without physical radio: ./nicFWutil.py -d /dev/pts/N
+# - EEPROM content is kept in memory, optionally loaded from/saved to image file
+# - serial line timing is modeled per byte in both directions (baudrate), plus radio turnaround time
+#   and latency added by USB-serial adapter
+
+DEFAULT_BAUDRATE = 38400
+DEFAULT_TURNAROUND = 0.001          # time radio needs to start response after request (s)
+DEFAULT_LATENCY = 0.004             # latency added by USB-serial adapter (s)
+DEFAULT_MIN_KEY_TIME = 0.05         # shorter key presses are not registered by radio (s)
+DEFAULT_BATTERY_ADC = 2048          # raw value returned for battery ADC read
+
+EEPROM_BLOCK_SIZE = 32
+EEPROM_BLOCKS = 256
+
+# nicFW commands
+CMD_START_REMOTE_SESSION    = 0x4A # w/  Ack
+CMD_END_REMOTE_SESSION      = 0x4B # w/  Ack
+CMD_READ_EEPROM             = 0x30 # w/  Ack
+CMD_WRITE_EEPROM            = 0x31 # w/  Ack
+CMD_READ_BATTERY_ADC        = 0x32 # w/  Ack
+CMD_DISABLE_RADIO           = 0x45 # w/  Ack
+CMD_ENABLE_RADIO            = 0x46 # w/  Ack
+CMD_FLASHLIGHT_ON           = 0x47 # w/o Ack
+CMD_FLASHLIGHT_OFF          = 0x48 # w/o Ack
+CMD_RESET_RADIO             = 0x49 # w/o Ack
+KEY_PRESS                   = 0x80 # 0x80|key, w/o Ack
+KEY_RELEASE                 = 0xFF # w/o Ack
+
+KEY_NAMES = [ '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
+              'menu', 'up', 'down', 'back', '*', '#', 'ptt', 'f1', 'f2' ]
+
+
+# emulated radio connected to pseudo-terminal
+class RadioEmulator:
+
+    def __init__(self, image=None, image_file=None, baudrate=DEFAULT_BAUDRATE, turnaround=DEFAULT_TURNAROUND,
+                 latency=DEFAULT_LATENCY, min_key_time=DEFAULT_MIN_KEY_TIME, debug=False):
+
+        if image is None:
+            image = bytes([255]*EEPROM_BLOCKS*EEPROM_BLOCK_SIZE) # erased EEPROM
+
+        if len(image) != EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+            raise ValueError("image has wrong size ({} but should be {} bytes)".format(len(image),EEPROM_BLOCKS*EEPROM_BLOCK_SIZE))
+
+        self.eeprom = bytearray(image)
+        self.image_file = image_file        # if set, every block write is saved to this file
+        self.debug = debug
+
+        # line timing
+        if baudrate > 0:
+            self.byte_time = 10/baudrate    # 8N1 -- 10 bits per byte
+        else:
+            self.byte_time = 0
+        self.turnaround = turnaround
+        self.latency = latency
+        self.min_key_time = min_key_time
+
+        # radio state
+        self.radio_enabled = True
+        self.remote_session = False
+        self.flashlight = False
+        self.battery_adc = DEFAULT_BATTERY_ADC
+        self.pressed_key = None
+        self.pressed_time = 0
+        self.keys = []                      # registered key presses (name, hold time)
+
+        self.stats = {}
+        self.reset_stats()
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+
+        self.wire_free = 0                  # time when radio TX line will be idle
+        self.output = queue.Queue()         # (delivery time, bytes) to be sent to host
+
+        self.host_wire_free = 0             # time when host TX line will be idle
+        self.input = queue.Queue()          # (bytes, arrival time of every byte) received from host
+        self.rx_buffer = bytearray()        # received bytes not yet consumed by serve()
+        self.rx_times = []                  # arrival times of rx_buffer bytes
+
+        self.running = False
+        self.threads = []
+
+    def reset_stats(self):
+        self.stats = {
+            'round_trips': 0,               # requests which got response
+            'bytes_in': 0,                  # bytes received from host
+            'bytes_out': 0,                 # bytes sent to host
+            'block_reads': 0,
+            'block_writes': 0,
+            'checksum_errors': 0,
+            'eeprom_access_enabled': 0,     # EEPROM access while radio was not disabled
+            'disable': 0,
+            'enable': 0,
+            'resets': 0,
+            'key_events': 0,
+            'first_byte': None,             # monotonic time of first received byte
+            'last_byte': None,              # monotonic time of last sent/received byte
+        }
+
+    def start(self):
+        self.running = True
+        for target in (self.serve, self.deliver, self.collect):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        self.running = False
+        self.output.put(None)
+        self.input.put(None)
+        os.close(self.slave)
+        os.close(self.master)
+
+    # collect bytes written by host
+    # - bytes are stamped with the time they have been fully received by radio, host line
+    #   takes byte_time per byte too (pseudo-terminal delivers them at once)
+    def collect(self):
+
+        while self.running:
+
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                chunk = b''
+
+            if chunk == b'':
+                self.input.put(None)
+                break
+
+            start = max(time.monotonic(), self.host_wire_free)
+            times = [ start + self.byte_time*(i+1) for i in range(len(chunk)) ]
+            self.host_wire_free = times[-1]
+
+            self.input.put((chunk, times))
+
+    # read exactly n bytes from host, returns when the last of them has arrived
+    def receive(self, n):
+
+        while len(self.rx_buffer) < n:
+            item = self.input.get()
+            if item is None:
+                self.input.put(None)
+                raise EOFError
+            chunk, times = item
+            self.rx_buffer.extend(chunk)
+            self.rx_times.extend(times)
+
+        data = bytes(self.rx_buffer[:n])
+        arrival = self.rx_times[n-1]
+        del self.rx_buffer[:n]
+        del self.rx_times[:n]
+
+        sleep_time = arrival - time.monotonic()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+        now = time.monotonic()
+        if self.stats['first_byte'] is None:
+            self.stats['first_byte'] = now
+        self.stats['last_byte'] = now
+        self.stats['bytes_in'] += n
+
+        return data
+
+    # schedule response to host
+    # - response starts after turnaround time (and after previous response has been sent),
+    #   takes byte_time per byte on the line and reaches host after adapter latency
+    def send(self, data, round_trip=True):
+
+        now = time.monotonic()
+        start = max(now+self.turnaround, self.wire_free)
+        self.wire_free = start + self.byte_time*len(data)
+
+        # radio is busy until whole response is on the line
+        sleep_time = self.wire_free - now
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+        self.stats['bytes_out'] += len(data)
+        if round_trip:
+            self.stats['round_trips'] += 1
+
+        self.output.put((self.wire_free+self.latency, data))
+
+    # deliver scheduled responses to host
+    def deliver(self):
+
+        while self.running:
+
+            item = self.output.get()
+            if item is None:
+                break
+
+            delivery_time, data = item
+            sleep_time = delivery_time - time.monotonic()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+            try:
+                os.write(self.master, data)
+            except OSError:
+                break
+
+            self.stats['last_byte'] = time.monotonic()
+
+    def log(self, msg):
+        if self.debug:
+            print("[DBG] {}".format(msg))
+
+    # handle commands from host
+    def serve(self):
+
+        while self.running:
+            try:
+                cmd = self.receive(1)[0]
+                self.handle(cmd)
+            except (EOFError, OSError):
+                break
+
+    def handle(self, cmd):
+
+        if cmd == CMD_READ_EEPROM:
+            address = self.receive(1)[0]
+            if self.radio_enabled:
+                self.stats['eeprom_access_enabled'] += 1
+            data = self.eeprom[address*EEPROM_BLOCK_SIZE:(address+1)*EEPROM_BLOCK_SIZE]
+            self.stats['block_reads'] += 1
+            self.log("read block {}".format(address))
+            self.send(bytes([CMD_READ_EEPROM]) + data + bytes([sum(data)%256]))
+
+        elif cmd == CMD_WRITE_EEPROM:
+            address = self.receive(1)[0]
+            data = self.receive(EEPROM_BLOCK_SIZE)
+            checksum = self.receive(1)[0]
+            if self.radio_enabled:
+                self.stats['eeprom_access_enabled'] += 1
+            if checksum != sum(data)%256:
+                # no ACK for corrupted data
+                self.stats['checksum_errors'] += 1
+                self.log("write block {} -- checksum error".format(address))
+                return
+            self.eeprom[address*EEPROM_BLOCK_SIZE:(address+1)*EEPROM_BLOCK_SIZE] = data
+            self.stats['block_writes'] += 1
+            self.log("write block {}".format(address))
+            self.save_block(address)
+            self.send(bytes([CMD_WRITE_EEPROM]))
+
+        elif cmd == CMD_READ_BATTERY_ADC:
+            self.log("battery ADC read")
+            self.send(bytes([CMD_READ_BATTERY_ADC]) + self.battery_adc.to_bytes(2, 'little'))
+
+        elif cmd == CMD_DISABLE_RADIO:
+            self.radio_enabled = False
+            self.stats['disable'] += 1
+            self.log("radio disabled")
+            self.send(bytes([cmd]))
+
+        elif cmd == CMD_ENABLE_RADIO:
+            self.radio_enabled = True
+            self.stats['enable'] += 1
+            self.log("radio enabled")
+            self.send(bytes([cmd]))
+
+        elif cmd == CMD_START_REMOTE_SESSION:
+            self.remote_session = True
+            self.log("remote session started")
+            self.send(bytes([cmd]))
+
+        elif cmd == CMD_END_REMOTE_SESSION:
+            self.remote_session = False
+            self.log("remote session finished")
+            self.send(bytes([cmd]))
+
+        elif cmd == CMD_FLASHLIGHT_ON:
+            self.flashlight = True
+            self.log("flashlight on")
+
+        elif cmd == CMD_FLASHLIGHT_OFF:
+            self.flashlight = False
+            self.log("flashlight off")
+
+        elif cmd == CMD_RESET_RADIO:
+            self.radio_enabled = True
+            self.remote_session = False
+            self.pressed_key = None
+            self.stats['resets'] += 1
+            self.log("radio reset")
+
+        elif cmd == KEY_RELEASE:
+            self.stats['key_events'] += 1
+            if self.pressed_key is not None:
+                hold_time = time.monotonic() - self.pressed_time
+                # too short presses are not noticed by radio
+                if hold_time >= self.min_key_time:
+                    self.keys.append((KEY_NAMES[self.pressed_key], hold_time))
+                    self.log("key '{}' pressed for {:.3f}s".format(KEY_NAMES[self.pressed_key], hold_time))
+                else:
+                    self.log("key '{}' press too short ({:.3f}s), ignored".format(KEY_NAMES[self.pressed_key], hold_time))
+            self.pressed_key = None
+
+        elif cmd & KEY_PRESS and (cmd & ~KEY_PRESS) < len(KEY_NAMES):
+            self.stats['key_events'] += 1
+            self.pressed_key = cmd & ~KEY_PRESS
+            self.pressed_time = time.monotonic()
+
+        else:
+            self.log("unknown command 0x{:02x}".format(cmd))
+
+    # save written block to image file
+    def save_block(self, address):
+
+        if self.image_file is None:
+            return
+
+        with open(self.image_file, "r+b") as f:
+            f.seek(address*EEPROM_BLOCK_SIZE)
+            f.write(self.eeprom[address*EEPROM_BLOCK_SIZE:(address+1)*EEPROM_BLOCK_SIZE])
+
+
+######################################################################################
+######################################################################################
+# MAIN
+######################################################################################
+######################################################################################
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="nicFW radio emulator on pseudo-terminal")
+    parser.add_argument("--image", help="load EEPROM content from binary image file (default erased EEPROM)")
+    parser.add_argument("--save", action='store_true', help="save EEPROM writes back to image file")
+    parser.add_argument("--link", help="create symlink to emulated serial device (eg. /tmp/ttyNICFW)")
+    parser.add_argument("--baudrate", type=int, default=DEFAULT_BAUDRATE, help="modeled line speed, 0 for no line timing (default 38400)")
+    parser.add_argument("--turnaround", type=float, default=DEFAULT_TURNAROUND*1000, help="radio turnaround time in ms (default 1)")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY*1000, help="serial adapter latency in ms (default 4)")
+    parser.add_argument("--min-key-time", type=float, default=DEFAULT_MIN_KEY_TIME*1000, help="shortest key press registered by radio in ms (default 50)")
+    parser.add_argument("--debug", action='store_true', help="print every handled command")
+    args = parser.parse_args()
+
+    if args.save and args.image is None:
+        print("[ERR] --save can be used only with --image.")
+        sys.exit(2)
+
+    image = None
+    if args.image != None:
+        try:
+            with open(args.image, "rb") as f:
+                image = f.read()
+        except OSError:
+            print("[ERR] Could not open/read image file '{}'".format(args.image))
+            sys.exit(2)
+
+    try:
+        emulator = RadioEmulator(
+            image=image,
+            image_file=args.image if args.save else None,
+            baudrate=args.baudrate,
+            turnaround=args.turnaround/1000,
+            latency=args.latency/1000,
+            min_key_time=args.min_key_time/1000,
+            debug=args.debug)
+    except ValueError as e:
+        print("[ERR] {}".format(e))
+        sys.exit(2)
+
+    port_name = emulator.port_name
+    if args.link != None:
+        try:
+            if os.path.islink(args.link):
+                os.remove(args.link)
+            os.symlink(port_name, args.link)
+        except OSError:
+            print("[ERR] Could not create symlink '{}'".format(args.link))
+            sys.exit(2)
+        port_name = args.link
+
+    emulator.start()
+
+    print("nicFW emulator is listening on {} (Ctrl-C to stop)".format(port_name))
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+    if args.link != None and os.path.islink(args.link):
+        os.remove(args.link)
+
+    print()
+    for name in ('round_trips', 'bytes_in', 'bytes_out', 'block_reads', 'block_writes', 'checksum_errors', 'resets', 'key_events'):
+        print("{:15s} : {}".format(name, emulator.stats[name]))
+    print("{:15s} : {}".format("keys", ' '.join(k for k, t in emulator.keys)))
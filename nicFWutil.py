@@ -1,14 +1,55 @@
 #!/usr/bin/env python3
-import serial
 import sys
 import argparse
 from time import sleep
 import struct
 import re
+import os
+import stat
+import mmap
+import time
+import socket
+import socketserver
+import threading
+import glob
+import concurrent.futures
+import hashlib
+import csv
+import collections
+import json
+import bisect
+from contextlib import contextmanager
+
+# nicFWutil can be used as a library:
+#
+#   import nicFWutil
+#   radio = nicFWutil.Radio("/dev/ttyUSB0")    # serial device is opened on first I/O
+#   ch = nicFWutil.get_channel(radio, 12)   # Channel object or None for empty channel
+#   nicFWutil.print_channel(ch)
+#
+# all errors are reported with NicFWError exception
 
 DEFAULT_DEVICE = "/dev/ttyUSB0"
 DEFAULT_SERIAL_TIMEOUT = 1
 DEFAULT_KEY_PUSH_TIME = 0.33        # time to sleep after each key send/release action
+MIN_KEY_PUSH_TIME = 0.05            # shortest accepted key press/release time, emulator default, not calibrated on real firmware
+DEFAULT_READ_WINDOW = 1             # number of EEPROM read requests kept in flight (1 = stop-and-wait)
+VERIFY_READ_WINDOW = 4              # minimal read window used for read-back of written blocks
+DEFAULT_SOCKET_PATH = "/tmp/nicFWutil-{}.sock" # daemon socket, {} is replaced by device name
+TRACE_MAGIC = b"nicFWtrace\x01"    # wire trace file header (see --trace)
+EEPROM_BLOCK_SIZE = 32              # bytes in single EEPROM block
+EEPROM_BLOCKS = 256                 # number of EEPROM blocks (8 KiB in total)
+CHANNELS_COUNT = 198                # number of memory channels, channel N is stored in block N+1
+
+# EEPROM layout, named regions: (start byte, size in bytes)
+EEPROM_LAYOUT = {
+    'channels'      : (2*32,        32*198),    # channel N in block N+1, 32 bytes each
+    'fmtuner_freq'  : (204*32,      4*20),      # FM tuner frequencies, 4 bytes each
+    'fmtuner_band'  : (206*32+16,   1*20),      # FM tuner bands, 1 byte each
+    'bandplan'      : (208*32+2,    10*20),     # Band Plan entries, 10 bytes each
+    'scan_presets'  : (216*32,      14*10),     # Scan Presets, 14 bytes each
+}
+CHANNELS_BLOCK = EEPROM_LAYOUT['channels'][0]//32   # block of channel 1
 
 # nicFW commands
 CMD_START_REMOTE_SESSION    = b'\x4A' # w/  Ack
@@ -22,19 +63,21 @@ CMD_FLASHLIGHT_ON           = b'\x47' # w/o Ack
 CMD_FLASHLIGHT_OFF          = b'\x48' # w/o Ack
 CMD_RESET_RADIO             = b'\x49' # w/o Ack
 
-# dict for storing single channel data
-channel = {
-    "number": 0,
-    "name" : "",
-    "rx_f": 0,
-    "tx_f": 0,
-    "rx_subtone" : 0,
-    "tx_subtone" : 0,
-    "tx_power" : 0,
-    "groups_str" : "0000",
-    "modulation" : "",
-    "bandwidth" : "",
-    "is_empty" : True
+# number of argument bytes sent after command
+CMD_ARGS_LEN = {
+    CMD_READ_EEPROM[0]          : 1,        # address
+    CMD_WRITE_EEPROM[0]         : 1+32+1,   # address, data, checksum
+}
+
+# length of radio response (including ACK) for commands w/ Ack
+CMD_RESPONSE_LEN = {
+    CMD_START_REMOTE_SESSION[0] : 1,
+    CMD_END_REMOTE_SESSION[0]   : 1,
+    CMD_READ_EEPROM[0]          : 1+32+1,   # ACK, data, checksum
+    CMD_WRITE_EEPROM[0]         : 1,
+    CMD_READ_BATTERY_ADC[0]     : 1+2,      # ACK, ADC value
+    CMD_DISABLE_RADIO[0]        : 1,
+    CMD_ENABLE_RADIO[0]         : 1,
 }
 
 bandplan_mod = [ 'Ignore', 'FM', 'AM', 'USB', 'Enforce_FM', 'Enforce_AM', 'Enforce_USB', 'Enforce_None' ]
@@ -42,136 +85,16 @@ bandplan_bw = [ 'Ignore', 'Wide', 'Narrow', 'Enforce_Wide', 'Enforce_Narrow' ]
 NoYes = [ 'No', 'Yes' ]
 fm_band = [ 'West', 'Japan', 'World', 'Low_VHF' ]
 sp_mod = ['FM', 'AM', 'USB' ]
+MODULATIONS = [ 'Auto', 'FM', 'AM', 'USB' ]
+BANDWIDTHS = [ 'Wide', 'Narrow' ]
 
-# args
-parser = argparse.ArgumentParser()
-parser.add_argument("-d", "--device", help="serial device to communicate with radio (default /dev/ttyUSB0)")
-parser.add_argument("-c", "--channel", type=int, help="channel number to edit/update/remove")
-parser.add_argument("-n", "--name", help="channel name")
-parser.add_argument("-tx", "--tx", type=int, help="TX frequency")
-parser.add_argument("-rx", "--rx", type=int, help="RX frequency")
-parser.add_argument("-txc", "--tx-ctcss", type=int, help="TX CTCSS tone")
-parser.add_argument("-rxc", "--rx-ctcss", type=int, help="RX CTCSS tone")
-parser.add_argument("-p", "--power", type=int, help="TX power")
-parser.add_argument("-m", "--modulation", help="modulation")
-parser.add_argument("-b", "--bandwidth", help="bandwidth")
-parser.add_argument("-g", "--groups", help="groups to add channel to (eg. ABCD, A00F)")
-parser.add_argument("-r", "--reset", action='store_true', help="reset radio")
-parser.add_argument("--remove", action='store_true', help="remove channel")
-parser.add_argument("-u", "--update", action='store_true', help="update existing channel")
-parser.add_argument("-w", "--write", action='store_true', help="create new channel/overwrite existing one")
-parser.add_argument("-f1", "--flashlight-on", action='store_true', help="turn flashlight ON")
-parser.add_argument("-f0", "--flashlight-off", action='store_true', help="turn flashlight OFF")
-parser.add_argument("-k", "--key", help="send KEY(s) sequence to radio")
-parser.add_argument("-e", "--export-csv", help="export channels to CSV file")
-parser.add_argument("-f", "--fixed-width", action='store_true', help="use fixed width data when exporting CSV")
-parser.add_argument("-i", "--import-csv", help="import channels from CSV file")
-parser.add_argument("-se", "--show-eeprom", action='store_true', help="read and print eeprom content")
-parser.add_argument("-sb", "--show-bandplan", action='store_true', help="read and show Band Plan")
-parser.add_argument("-ib", "--import-bandplan", help="import bandplan from file")
-parser.add_argument("-sf", "--show-fmtuner", action='store_true', help="read and show FM Tunner channels")
-parser.add_argument("-ssp", "--show-scan-presets", action='store_true', help="read and show Scan Presets")
-parser.add_argument("--debug", action='store_true', help="enable debug messages")
-args = parser.parse_args()
-
-debug = args.debug
-
-# check for no args
-if not any(vars(args).values()):
-    parser.print_help()
-    sys.exit(2)
-
-# count specified channel actions
-action_count = 0
-for i in (args.write, args.update, args.remove):
-    if i == True:
-        action_count += 1
-
-# count specified modifiers
-modifiers_count = 0
-for i in (args.name, args.power, args.tx_ctcss, args.rx_ctcss, args.rx, args.tx, args.modulation, args.bandwidth, args.groups):
-    if i != None:
-        modifiers_count += 1
-
-# check for multiple channel actions at once
-if action_count > 1:
-    print("[ERR] choose only one action from [write/update/remove].")
-    sys.exit(2)
-
-# check if modifiers is used with remove channel action
-if args.remove != False and modifiers_count > 0:
-    print("[ERR] channel modifiers can't be used with channel remove action.")
-    sys.exit(2)
-
-# check if at least one modifier is used with update channel action
-if args.update != False and modifiers_count == 0:
-    print("[ERR] Update channel action need at least one channel modifier.")
-    sys.exit(2)
-
-# check for modifiers used without proper channel action
-if modifiers_count > 0 and args.update == False and args.write == False:
-    print("[ERR] channel modifiers used without channel action.")
-    sys.exit(2)
-
-# check for channel modifiers used with import/export action
-if modifiers_count > 0 and (args.export_csv != None or args.import_csv != None):
-    print("[ERR] channel modifiers used without import/export action.")
-    sys.exit(2)
-
-# check for using fixed width data without export action
-if args.fixed_width != False and args.export_csv == None:
-    print("[ERR] fixed width data  modifier used without export action.")
-    sys.exit(2)
-
-# check for using import and export action at once
-if args.import_csv != None and args.export_csv != None:
-    print("[ERR] import and export action used at once.")
-    sys.exit(2)
-
-# require channel number for channel actions
-if args.channel == None:
-    if args.write != False or args.update != False or args.remove != False:
-        print("[ERR] channel number has been not specified.");
-        exit (2)
- 
-# if device is not specified, use default one
-device = args.device
-if device is None:
-    device = DEFAULT_DEVICE
-
-if debug:
-    print("[DBG] Using '{}' device...".format(device))
-
-# Try to open serial device
-try:
-    port = serial.Serial(device, baudrate=38400, timeout=DEFAULT_SERIAL_TIMEOUT)
-except serial.serialutil.SerialException:
-    print("[ERR] problem occured when trying to open '{}' device".format(device))
-    sys.exit(2)
-
-
-def write_cmd(cmd, check_ack=False):
-    port.write(cmd)
-    if check_ack == True:
-        ack = port.read(1)
-        if ack != cmd:
-            print("[ERR] Unable to communicate with nicFW -- there was no valid ACK for {} command ({} recaived).".format(cmd,ack))
-            sys.exit(2)
-
-def disable_radio():
-    write_cmd(CMD_DISABLE_RADIO, check_ack=True)
-
-def enable_radio():
-    write_cmd(CMD_ENABLE_RADIO, check_ack=True)
+debug = False
 
-def reset_radio():
-    write_cmd(CMD_RESET_RADIO)
 
-def enable_remote():
-    write_cmd(CMD_START_REMOTE_SESSION)
+# all nicFWutil errors (communication, validation, file access)
+class NicFWError(Exception):
+    pass
 
-def disable_remote():
-    write_cmd(CMD_END_REMOTE_SESSION)
 
 # calculate checksum of bytearray
 def calc_checksum(bytes):
@@ -183,20 +106,13 @@ def calc_checksum(bytes):
 
     return (checksum % 256).to_bytes(1);
 
-exit_info = None
-def exit(err_code):
-    if exit_info != None:
-        print(exit_info)
-    sys.exit(err_code)
-
 # convert variable to int
 # - if variable is str check if contains only digits
 def conv2int(desc, var):
 
     if isinstance(var, str):
         if var.isnumeric() == False:
-            print("[ERR] {} must contain only digits, but additional characters in '{}' has been found.".format(desc,var))
-            exit(2)
+            raise NicFWError("{} must contain only digits, but additional characters in '{}' has been found.".format(desc,var))
         return int(var)
 
     else:
@@ -208,11 +124,35 @@ def check_channel_number(channel_number):
     number = conv2int ("Channel number", channel_number)
 
     if number < 1 or number > 198:
-        print("[ERR] wrong channel number '{}' -- should be in the range from 1 to 198.".format(channel_number))
-        exit(2)
+        raise NicFWError("wrong channel number '{}' -- should be in the range from 1 to 198.".format(channel_number))
 
     return number
 
+# parse channel list with ranges (eg. 1-50,60,70-80), returns sorted channel numbers
+def parse_channel_list(channels_str):
+
+    numbers = set()
+
+    for item in str(channels_str).split(","):
+
+        item = item.strip()
+        if item == "":
+            continue
+
+        first, sep, last = item.partition("-")
+        first = check_channel_number(first.strip())
+        last = check_channel_number(last.strip()) if sep else first
+
+        if first > last:
+            raise NicFWError("wrong channel range '{}'.".format(item))
+
+        numbers.update(range(first, last+1))
+
+    if not numbers:
+        raise NicFWError("channel number has been not specified.")
+
+    return sorted(numbers)
+
 # validate group names
 def check_groups(groups_str):
 
@@ -224,12 +164,10 @@ def check_groups(groups_str):
         groupsUP += group
 
         if (ord(group) < 65 or ord(group)>79) and group != '0': # 0 for allowing eg. 000A to assing only 4th group
-            print("[ERR] group should be letter betwen A-O (or 0 for group) but '{}' has been found".format(group))
-            sys.exit(1)
+            raise NicFWError("group should be letter betwen A-O (or 0 for group) but '{}' has been found".format(group))
 
     if len(groups_str)>4:
-        print ("[ERR] you can assign up to 4 groups only.")
-        exit(2)
+        raise NicFWError("you can assign up to 4 groups only.")
 
     return groupsUP
 
@@ -242,10 +180,6 @@ def check_name(name):
     if name_len > 12:
         print("[WARN] name has been trimmed to 12 characters.")
         name = name[:12]
-    # fill name to 12 bytes
-    if name_len < 12:
-        for i in range(12-name_len):
-            name += '\0' # fill up with \0s
 
     return name
 
@@ -258,8 +192,7 @@ def check_frequency(frequency,zero_allowed=False):
         return 0
 
     if number < 1800000 or number > 130000000:
-        print("[ERR] Frequency should be in the range from 1800000 to 130000000.")
-        exit(2)
+        raise NicFWError("Frequency should be in the range from 1800000 to 130000000.")
 
     return number
 
@@ -270,8 +203,7 @@ def check_subtone(subtone):
     number = conv2int ("Subtone", subtone)
 
     if (number < 670 or number > 2541) and number != 0:
-        print("[ERR] Subtone should be in the range from 670 to 2541 range (or 0 to disable).")
-        exit(2)
+        raise NicFWError("Subtone should be in the range from 670 to 2541 range (or 0 to disable).")
 
     return number
 
@@ -280,8 +212,7 @@ def check_power(power):
     number = conv2int ("Power", power)
 
     if number < 0 or number > 255:
-        print("[ERR] Power should be in the range from 0 to 255.")
-        exit(2)
+        raise NicFWError("Power should be in the range from 0 to 255.")
 
     return number
 
@@ -290,22 +221,21 @@ def check_bandwidth(bandwidth):
     if bandwidth.upper() in [ 'WIDE', 'NARROW' ]:
        return bandwidth
 
-    else:
-        print("[ERR] Bandwidth should be in [ 'Wide', 'Narrow' ], but '{}' found".format(bandwidth))
-        exit(2)
-
-    return bandwidth
+    raise NicFWError("Bandwidth should be in [ 'Wide', 'Narrow' ], but '{}' found".format(bandwidth))
 
 def check_modulation(modulation):
 
     if modulation.upper() in [ 'AUTO', 'FM', 'AM', 'USB' ]:
        return modulation
 
-    else:
-        print("[ERR] Modulation should be in [ 'Auto', 'FM', 'AM', 'USB' ], but '{}' found".format(modulation))
-        exit(2)
+    raise NicFWError("Modulation should be in [ 'Auto', 'FM', 'AM', 'USB' ], but '{}' found".format(modulation))
 
-    return modulation
+# returns index of value in values_array (case insensitive)
+def check_str_in_array(value,values_array,desc):
+    for i, s in enumerate(values_array):
+        if s.lower() == value.lower():
+            return i
+    raise NicFWError("wrong {} value '{}', allowed: {}".format(desc, value,', '.join(values_array)))
 
 # convert group letter (A-O) to number (1-15)
 def group_a2i(group):
@@ -324,9 +254,9 @@ def group_s2b(groups_str):
 
     groups_arr = bytearray(2)
     groups_arr[0] |= group_a2i(groups_str[0])
-    groups_arr[0] |= group_a2i(groups_str[1]) << 4 
+    groups_arr[0] |= group_a2i(groups_str[1]) << 4
     groups_arr[1] |= group_a2i(groups_str[2])
-    groups_arr[1] |= group_a2i(groups_str[3]) << 4 
+    groups_arr[1] |= group_a2i(groups_str[3]) << 4
 
     return groups_arr
 
@@ -355,794 +285,3194 @@ def group_b2an(group_bytes):
 
     return group_array
 
-# DEBUG groups
-#ga = group_s2b("A0C@")
-#gs = group_an2s(group_b2an(ga))
-#print("{} : {}".format(ga,gs))
-#sys.exit(1)
 
-# print channel data
-def print_channel():
+######################################################################################
+# RADIO
+######################################################################################
 
-    print ("{:10s} : CH-{:03d}".format("channel", channel['number']))
-    print ("{:10s} : {}".format("name", channel['name']))
-    print ("{:10s} : {}".format("RX freq", channel['rx_f']))
-    print ("{:10s} : {}".format("TX freq", channel['tx_f']))
-    print ("{:10s} : {}".format("RX subtone", channel['rx_subtone']))
-    print ("{:10s} : {}".format("TX subtone", channel['tx_subtone']))
-    print ("{:10s} : {}".format("TX power", channel['tx_power']))
-    print ("{:10s} : {}".format("group", channel['groups_str'])) # group_an2s(group_array')
-    print ("{:10s} : {}".format("bandwidth", channel['bandwidth']))
-    print ("{:10s} : {}".format("modulation", channel['modulation']))
+# serial port replacement, which forwards communication to nicFWutil daemon (see --serve)
+class DaemonPort:
 
+    def __init__(self, sock):
+        self.sock = sock
+        self.timeout = DEFAULT_SERIAL_TIMEOUT
 
-# decode channel data received from radio
-def decode_channel_data(data):
+    def write(self, data):
+        self.sock.sendall(bytes(data))
 
-    global channel
+    # read up to size bytes, return less if timeout occurs (like serial.Serial.read)
+    def read(self, size=1):
 
-    group_array = bytearray(4)
+        data = b''
+        deadline = time.monotonic() + self.timeout
 
-    channel['rx_f']         = int.from_bytes(data[0:4], 'little')
-    channel['tx_f']         = int.from_bytes(data[4:8], 'little')
-    channel['rx_subtone']   = int.from_bytes(data[8:10], 'little')
-    channel['tx_subtone']   = int.from_bytes(data[10:12], 'little')
-    channel['tx_power']     = data[12]
-#    group_bytes = int.from_bytes(data[13:14], 'little')
-#    mod_bw = int.from_bytes(data[15:16], 'little')
-#    reserved = int.from_bytes(data[16:20], 'little')
-    channel['name']         = data[20:32].decode('utf-8', 'replace')
+        while len(data) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.sock.settimeout(remaining)
+            try:
+                chunk = self.sock.recv(size-len(data))
+            except socket.timeout:
+                break
+            if chunk == b'':
+                break
+            data += chunk
 
-    channel['groups_str'] = group_an2s(group_b2an([data[13],data[14]]))
+        return data
 
-    if data[15] & 0b00000001:
-        bandwidth = "Narrow"
-    else:
-        bandwidth = "Wide"
-    
-    channel['bandwidth'] = bandwidth
-
-    match (data[15] >> 1) & 0b00000011:
-        case 0:
-            modulation = "Auto"
-        case 1:
-            modulation = "FM"
-        case 2:
-            modulation = "AM"
-        case 3:
-            modulation = "USB"
-
-    channel['modulation'] = modulation
-
-
-def encode_channel_data():
-
-    global channel
-
-    mod_bw = bytearray(2)
-    reserved = [ 255, 255, 255, 255]
-
-    mod = 0
-    match channel['modulation'].upper():
-        case "AUTO":
-            mod = 0
-        case "FM":
-            mod = 1
-        case "AM":
-            mod = 2
-        case "USB":
-            mod = 3
-        case _:
-            print("[ERR] Wrong modulation value ({}).".format(channel['modulation']))
-            sys.exit(2)
+    @property
+    def in_waiting(self):
+        try:
+            return len(self.sock.recv(4096, socket.MSG_PEEK | socket.MSG_DONTWAIT))
+        except BlockingIOError:
+            return 0
 
-    bw = 0
-    match channel['bandwidth'].upper():
-        case "WIDE":
-            bw = 0
-        case "NARROW":
-            bw = 1
-        case _:
-            print("[ERR] Wrong bandwidth value ({}).".format(bw))
-            sys.exit(2)
- 
-    mod_bw = (mod<<1) | bw  
-    mod_bw |= 0b11111000 # add reserved bits as 1
-        
-    data = bytearray()
-    data.extend(channel['rx_f'].to_bytes(4, byteorder='little'))
-    data.extend(channel['tx_f'].to_bytes(4, byteorder='little'))
-    data.extend(channel['rx_subtone'].to_bytes(2, byteorder='little'))
-    data.extend(channel['tx_subtone'].to_bytes(2, byteorder='little'))
-    data.append(channel['tx_power'])
-    data.extend(group_s2b(channel['groups_str']))
-    data.append(mod_bw)
-    data.extend(reserved)
-    data.extend(channel['name'].encode())
-
-    data_len = len(data)
-    if data_len != 32:
-        print("[ERR] encoded data has wrong size ({} but should be {} bytes), something went terribly wrong.".format(data_len,32))
-        sys.exit(2)
+    def close(self):
+        self.sock.close()
 
-    return data
+# connect to daemon, returns None if daemon is not running
+def connect_daemon(socket_path):
 
+    if not os.path.exists(socket_path):
+        return None
 
-# get eeprom block (32 bytes)
-def get_eeprom_block(address):
+    # socket in shared directory may be planted by another user, who would answer with fake data
+    st = os.lstat(socket_path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise NicFWError("daemon socket '{}' is not a socket owned by current user, refusing to use it.".format(socket_path))
 
-    port.write(CMD_READ_EEPROM)
-    port.write([address])
-    ack = port.read(1)
-#    if ack != CMD_READ_EEPROM:
-#        print("[ERR] no Ack.")
-#        sys.exit(2)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
 
-    data = port.read(32)
+    return DaemonPort(sock)
 
-    checksum_r = port.read(1)
 
-    if checksum_r != calc_checksum(data):
-        print ("[ERR] received data checksum mismatch!")
-        sys.exit(2)
-    if debug:
-        print ("[DBG] received checksum OK")
+# radio I/O statistics: counters and wall time spent in phases
+# - phases are exclusive, time of nested phase is not counted in outer one
+class Stats:
 
-    return data
+    COUNTERS = ( 'bytes_sent', 'bytes_received', 'commands', 'block_reads', 'block_writes',
+                 'checksum_errors', 'ack_errors', 'timeouts', 'retries' )
+    PHASES = ( 'open', 'session', 'read', 'write', 'decode', 'file', 'keys' )
 
+    def __init__(self):
+        self.start = time.monotonic()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self._stack = []                # currently measured phases: [name, start time]
 
-# read channel bytes from radio
-def get_channel(channel_number):
+    def count(self, name, n=1):
+        self.counters[name] += n
 
-    global channel
+    @contextmanager
+    def phase(self, name):
 
-    disable_radio()
+        now = time.monotonic()
+        if self._stack:
+            outer = self._stack[-1]
+            self.phases[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
 
-    data = get_eeprom_block(channel_number+1)
+        try:
+            yield
+        finally:
+            now = time.monotonic()
+            name, since = self._stack.pop()
+            self.phases[name] += now - since
+            if self._stack:
+                self._stack[-1][1] = now
+
+    # dict with wall time, phases (time not covered by any phase is 'other') and counters
+    def report(self):
+
+        wall_time = time.monotonic() - self.start
+        phases = dict(self.phases)
+        phases['other'] = max(0.0, wall_time - sum(self.phases.values()))
+
+        return { 'wall_time': wall_time, 'phases': phases, 'counters': dict(self.counters) }
+
+# serial port (or daemon connection) wrapper counting bytes and timeouts (short reads)
+# - I/O errors of port (serial device or daemon socket) are raised as NicFWError
+class StatsPort:
+
+    def __init__(self, port, stats):
+        self.port = port
+        self.stats = stats
+        self.draining = False           # input is being dropped, short reads are not timeouts
+
+    def write(self, data):
+        self.stats.count('bytes_sent', len(data))
+        try:
+            return self.port.write(data)
+        except OSError as e:
+            raise NicFWError("communication with radio failed ({})".format(e))
 
-    enable_radio()
+    def read(self, size=1):
+        try:
+            data = self.port.read(size)
+        except OSError as e:
+            raise NicFWError("communication with radio failed ({})".format(e))
+        self.stats.count('bytes_received', len(data))
+        if len(data) < size and not self.draining:
+            self.stats.count('timeouts')
+        return data
+
+    @property
+    def in_waiting(self):
+        try:
+            return self.port.in_waiting
+        except OSError as e:
+            raise NicFWError("communication with radio failed ({})".format(e))
 
-    if data == b'':
-        print("[ERR] received empy channel data!")
-        sys.exit(2)
+    def close(self):
+        self.port.close()
 
-    # check if channel has only 0xff values (is empty)
-    is_empty = True
-    for i in data:
-        if ( i != 255):
-            is_empty = False
-            break
 
-    channel['is_empty'] = is_empty
-    channel['number'] = channel_number
+# statistics report of radio (dict), error is None if action succeeded
+def stats_report(radio, error=None):
 
-    # decode channel bytes to channel variables
-    if is_empty == False:
-        decode_channel_data(data)
+    report = radio.stats.report()
+    report['device'] = radio.image if radio.image is not None else radio.device
+    report['error'] = error
+    report['counters']['cache_hits'] = radio.block_cache.hits
 
+    return report
 
-# write channel bytes to radio
-def write_channel_bytes(channel_number,data_bytes):
+# print statistics reports in human readable form
+def print_stats(reports, file=sys.stderr):
 
-    global channel
+    for report in reports:
+        print("stats for {}: {:.3f}s{}".format(report['device'], report['wall_time'], " (failed)" if report['error'] else ""), file=file)
+        print("  " + "  ".join("{} {:.3f}s".format(name, t) for name, t in report['phases'].items()), file=file)
+        print("  " + "  ".join("{} {}".format(name, n) for name, n in report['counters'].items()), file=file)
 
-    checksum = calc_checksum(data_bytes)
+# write statistics reports to JSON file ('-' for stdout)
+def write_stats_json(reports, file):
 
-    if debug:
-        print("[DBG] bytes to write:{} checksum:{}".format(data_bytes,checksum))
+    data = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'args': sys.argv[1:],
+        'radios': reports,
+    }
 
-    disable_radio()
+    if file == "-":
+        json.dump(data, sys.stdout, indent=2)
+        print()
+        return
 
-    port.write(CMD_WRITE_EEPROM)
-    port.write([channel_number+1])
-    port.write(data_bytes)
-    port.write(checksum)
-    ack = port.read(1)
+    try:
+        with open(file, "w") as f:
+            json.dump(data, f, indent=2)
+    except OSError:
+        raise NicFWError("Could not open/write file '{}'".format(file))
 
-    enable_radio()
 
-    if ack == CMD_WRITE_EEPROM:
-        if debug:
-            print("[DBG] write OK")
-    else:
-        print("[ERR] invalid ACK after write, something went wrong!")
-        sys.exit(2)
+# wire trace file: TRACE_MAGIC followed by records
+# - record: direction (b'>' sent to radio, b'<' received from radio), time since previous record
+#   in microseconds (uint32), data length (uint16), data
+# - received record with no data is read timeout
+TRACE_RECORD = struct.Struct("<cIH")
 
-# prepare channel data for write
-def write_channel():
+# serial port (or daemon connection) wrapper recording every written and read byte to trace file
+class TracePort:
 
-    global channel
+    def __init__(self, port, file_name):
 
-    if args.name is not None:
-        channel['name'] = check_name(args.name)
-    else:
-        channel['name'] = check_name(channel['name'])
-
-    if args.rx is not None:
-        channel['rx_f'] = check_frequency(args.rx)
-    if args.tx is not None:
-        channel['tx_f'] = check_frequency(args.tx)
-    if args.tx_ctcss is not None:
-        channel['tx_subtone'] = check_subtone(args.tx_ctcss)
-    if args.rx_ctcss is not None:
-        channel['rx_subtone'] = check_subtone(args.rx_ctcss)
-    if args.power is not None:
-        channel['tx_power'] = check_power(args.power)
-    if args.groups is not None:
-        channel['groups_str'] = check_groups(args.groups)
-    if args.modulation is not None:
-        channel['modulation'] = check_modulation(args.modulation)
-    if args.bandwidth is not None:
-        channel['bandwidth'] = check_bandwidth(args.bandwidth)
-    
-    print_channel()
-
-    data_w = encode_channel_data()
-
-    write_channel_bytes(channel['number'], data_w)
-
-    # optional radio reset after channel write (only if -r)
-    if args.reset:
-        disable_remote()
-        reset_radio()
+        try:
+            self.file = open(file_name, "wb")
+            self.file.write(TRACE_MAGIC)
+        except OSError:
+            raise NicFWError("Could not open/write file '{}'".format(file_name))
 
-    sys.exit(0)
+        self.port = port
+        self.file_name = file_name
+        self.last = time.monotonic()
 
-# writes previously generated (file import) ChannelsDict to radio
-def write_channels_from_dict(ChannelsDict):
+    def record(self, direction, data):
 
-    global channel
-   
-    # for each channel number in radio...
-    for channel_number in range(1,199):
+        now = time.monotonic()
+        delta = min(int((now - self.last)*1000000), 0xFFFFFFFF)
+        self.last = now
 
-        # show writing progress
-        if (channel_number)%11 == 0:
-            print("importing CH-{:03d}...CH-{:03d} ({:3.0f})%.".format(channel_number-10,channel_number,channel_number/198*100))
+        try:
+            self.file.write(TRACE_RECORD.pack(direction, delta, len(data)))
+            self.file.write(data)
+        except OSError:
+            raise NicFWError("Could not write file '{}'".format(self.file_name))
+
+    def write(self, data):
+        data = bytes(data)
+        result = self.port.write(data)
+        self.record(b'>', data)
+        return result
+
+    def read(self, size=1):
+        data = self.port.read(size)
+        self.record(b'<', data)
+        return data
+
+    @property
+    def in_waiting(self):
+        return self.port.in_waiting
+
+    def close(self):
+        self.port.close()
+        try:
+            self.file.close()
+        except OSError:
+            raise NicFWError("Could not write file '{}'".format(self.file_name))
 
-        # check if channel is in dictionary
-        if channel_number in ChannelsDict.keys():
+# read trace file, returns list of (direction, time since start, data)
+def read_trace_file(file_name):
 
-            c = ChannelsDict[channel_number]
+    try:
+        with open(file_name, "rb") as f:
+            trace = f.read()
+    except OSError:
+        raise NicFWError("Could not open/read trace file '{}'".format(file_name))
 
-            channel['name'] = c[0]
-            channel['rx_f'] = c[1]
-            channel['tx_f'] = c[2]
-            channel['rx_subtone'] = c[3]
-            channel['tx_subtone'] = c[4]
-            channel['tx_power'] = c[5]
-            channel['groups_str'] = c[6]
-            channel['bandwidth'] = c[7]
-            channel['modulation'] = c[8]
+    if not trace.startswith(TRACE_MAGIC):
+        raise NicFWError("'{}' is not nicFWutil trace file.".format(file_name))
 
-            data_w = encode_channel_data()
+    records = []
+    offset = len(TRACE_MAGIC)
+    t = 0.0
 
-        # if not -- overwrite channel with 0xff
-        else:
-            data_w = bytearray([255]*32) # fill up with 0xff
+    while offset < len(trace):
 
-        if debug:
-            print("data_w: {}",format(data_w))
+        if offset + TRACE_RECORD.size > len(trace):
+            raise NicFWError("trace file '{}' is truncated.".format(file_name))
 
-        write_channel_bytes(channel_number,data_w)
-    
-    print ("done.")
-    reset_radio()
+        direction, delta, length = TRACE_RECORD.unpack_from(trace, offset)
+        offset += TRACE_RECORD.size
 
-    sys.exit(0)
-            
-        
-######################################################################################
-######################################################################################
-# MAIN
-######################################################################################
-######################################################################################
+        if direction not in (b'>', b'<') or offset + length > len(trace):
+            raise NicFWError("trace file '{}' is corrupted.".format(file_name))
 
-# check channel number
-if args.channel != None:
-    channel['number'] = check_channel_number(args.channel)
+        t += delta/1000000
+        records.append((direction, t, trace[offset:offset+length]))
+        offset += length
 
-# write/overwrite channel
-if args.write:
+    return records
 
-    # default values for the newly created channel
-    channel['rx_f'] = 14495000
-    channel['tx_f'] = 14495000
-    channel['rx_subtone'] = 0
-    channel['tx_subtone'] = 0
-    channel['tx_power'] = 0
-    channel['groups_str'] = "0000"
-    channel['modulation'] = "Auto"
-    channel['bandwidth'] = "Narrow"
-    channel['name']= "CH-{:03n}".format(channel['number'])
+# serial port replacement, which plays radio side of recorded trace
+# - written bytes have to match recorded ones (the same command stream), otherwise
+#   NicFWError is raised at first difference
+# - received bytes are available after all bytes sent before them are written, reading
+#   more than available returns less (like serial read timeout)
+# - with timing, received bytes are available not earlier than at recorded time
+class ReplayPort:
 
-    write_channel()
+    def __init__(self, file_name, timing=False):
 
-    sys.exit()
+        self.file_name = file_name
+        self.records = read_trace_file(file_name)
+        self.timing = timing
+        self.timeout = DEFAULT_SERIAL_TIMEOUT
 
-# remove channel
-if args.remove:
+        self.index = 0                  # current record
+        self.sent = 0                   # bytes of current sent record already written
+        self.received = bytearray()     # received bytes available for reading
+        self.start = time.monotonic()
 
-    print("Removing channel CH-{:03d}".format(channel['number']))
+    # make received records up to next sent record available
+    def advance(self):
 
-    data_w = bytearray([255]*32) # fill up with 0xff
-    write_channel_bytes(channel['number'], data_w)
+        while self.index < len(self.records) and self.records[self.index][0] == b'<':
 
-    print("Done.")
+            direction, t, data = self.records[self.index]
 
-    sys.exit(0)
+            if self.timing:
+                delay = self.start + t - time.monotonic()
+                if delay > 0:
+                    sleep(delay)
 
+            self.received.extend(data)
+            self.index += 1
 
-# update channel
-if args.update:
+    def write(self, data):
 
-    get_channel(channel['number'])
+        data = bytes(data)
+        offset = 0
 
-    if channel['is_empty'] == False:
-        write_channel()
-    else:
-        print("Channel {} is empty -- cannot perform an UPDATE action!".format(channel['number']))
+        while offset < len(data):
 
-    sys.exit()
+            self.advance()
 
-# print info about channel
-if args.channel:
+            if self.index >= len(self.records):
+                raise NicFWError("trace replay: {} written after end of trace.".format(data[offset:].hex()))
 
-    get_channel(channel['number'])
+            expected = self.records[self.index][2]
+            n = min(len(expected) - self.sent, len(data) - offset)
 
-    if channel['is_empty'] == False:
-        print_channel()
-    else:
-        print("Channel {} is empty.".format(channel['number']))
+            if data[offset:offset+n] != expected[self.sent:self.sent+n]:
+                raise NicFWError("trace replay: record {} expected {} written but {} was sent.".format(
+                    self.index, expected[self.sent:self.sent+n].hex(), data[offset:offset+n].hex()))
 
-    sys.exit(0);
+            offset += n
+            self.sent += n
 
-# turn flashlight on
-if args.flashlight_on:
-    write_cmd(CMD_FLASHLIGHT_ON)
-    sys.exit(0)
+            if self.sent == len(expected):
+                self.index += 1
+                self.sent = 0
 
-# turn flashlight off
-if args.flashlight_off:
-    write_cmd(CMD_FLASHLIGHT_OFF)
-    sys.exit(0)
+        return len(data)
 
-# reset radio
-if args.reset:
-    disable_remote()
-    reset_radio()
-    sys.exit(0)
+    def read(self, size=1):
 
-# export all channels from radio to CSV file
-if args.export_csv != None:
+        self.advance()
 
-    header = ""
+        data = bytes(self.received[:size])
+        del self.received[:size]
 
-    file = args.export_csv
+        return data
 
-    if args.fixed_width == False:
-        line_format = "{:d},{:s},{:d},{:d},{:d},{:d},{:d},{:s},{:s},{:s}\n"
-        header += "Channel number,Rx frequency,Tx frequency,Rx subtone,Tx subtone,Tx power,Groups,Bandwidth,Modulation\n"
-    else:
-        line_format = "{:03d},{:12s},{:9d},{:9d},{:5d},{:5d},{:3d},{:4s},{:6s},{:4s}\n"
-        header += "CH#,Name        ,  Rx freq,  Tx freq,RxSub,TxSub,PWR,Grp ,Bwidth,Modulation\n"
+    @property
+    def in_waiting(self):
+        self.advance()
+        return len(self.received)
 
-    try:
-        f = open(file,"w")
-    except OSError:
-        print("[ERR] Could not open/write file '{}'".format(file))
-        sys.exit(2)
+    def close(self):
+        pass
 
-    # write file header
-    if header != "":
-        f.write(header)
+# print trace file in human readable form
+def print_trace(file_name):
 
-    for channel_number in range(1,199):
+    last = 0.0
 
-        get_channel(channel_number)
+    print("      time      delta  dir  data")
+    for direction, t, data in read_trace_file(file_name):
+        print("{:10.6f} {:10.6f}   {}   {}".format(t, t-last, direction.decode(), data.hex(' ') if data else "(timeout)"))
+        last = t
 
-        # show writing progress
-        if (channel_number)%11 == 0:
-            print("exporting CH-{:03d}...CH-{:03d} ({:3.0f})%.".format(channel_number-10,channel_number,channel_number/198*100))
- 
-        # write to file only valid channels       
-        if channel['is_empty'] == False:
-            f.write(line_format.format(
-                channel_number,
-                channel['name'].rstrip('\0'),
-                channel['rx_f'],
-                channel['tx_f'],
-                channel['rx_subtone'],
-                channel['tx_subtone'],
-                channel['tx_power'],
-                channel['groups_str'],
-                channel['bandwidth'],
-                channel['modulation'])
-            )
 
-    f.close
+# LRU cache of EEPROM blocks (address: data)
+class BlockCache:
 
-    print ("done.")
+    def __init__(self, size=EEPROM_BLOCKS):
+        self.size = size                # max number of cached blocks, 0 disables cache
+        self.blocks = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    sys.exit(0);
+    def get(self, address):
 
+        data = self.blocks.get(address)
 
-# import channels from CSV file
-if args.import_csv != None:
+        if data is None:
+            self.misses += 1
+            return None
 
-    # dictionary where channels data readed from file will be stored
-    ChannelsDict = {}
-    
-    try:
-        file = open(args.import_csv, "r")
-    except OSError:
-        print("[ERR] Could not open/read file '{}'".format(args.import_csv))
-        sys.exit(2)
-    
-    channels = {}
+        self.blocks.move_to_end(address)
+        self.hits += 1
 
-    lcount = 0
+        return data
 
-    for line in file:
+    def put(self, address, data):
 
-        line = line.rstrip('\n')
+        if self.size == 0:
+            return
 
-        lcount += 1
+        self.blocks[address] = bytes(data)
+        self.blocks.move_to_end(address)
 
-        # skip first line (header)
-        if lcount == 1:
-            continue
-        
-        # split line csv data by ','
-        csv_data = line.split(",")
+        while len(self.blocks) > self.size:
+            self.blocks.popitem(last=False)
 
-        # check array size
-        if len(csv_data) != 10:
-            print("[ERR] line {} has incorrect number of fields".format(lcount))
-            sys.exit(2)
+    def invalidate(self, address):
+        self.blocks.pop(address, None)
 
-        # set additional info on check fail
-        exit_info = "[ERR] import failed on line {}".format(lcount)
+    def clear(self):
+        self.blocks.clear()
 
-        # check and import channel settings
-        channel_number = check_channel_number(csv_data[0].strip(' '))
-        name = check_name(csv_data[1].rstrip(' '))
-        rx_f = check_frequency(csv_data[2].strip(' '))
-        tx_f = check_frequency(csv_data[3].strip(' '))
-        rx_subtone = check_subtone(csv_data[4].strip(' '))
-        tx_subtone = check_subtone(csv_data[5].strip(' '))
-        tx_power = check_power(csv_data[6].strip(' '))
-        groups = check_groups(csv_data[7])
-        bandwidth = check_bandwidth(csv_data[8].strip(' '))
-        modulation = check_modulation(csv_data[9].strip(' '))
 
-        if debug:       
-            print ("[DBG] file read: {} {} {} {} {} {} {} {} {} {}".format(channel_number,name,rx_f,tx_f,rx_subtone,tx_subtone,tx_power,groups,bandwidth,modulation))
+# radio connected to serial device (directly or through daemon), or EEPROM image file
+# - nothing is opened until first I/O
+class Radio:
 
-        # check for duplicates
-        if channel_number in ChannelsDict.keys():
-            print("[ERR] duplicated channel number: {}".format(channel_number))
-            sys.exit(2)
+    def __init__(self, device=None, image=None, socket_path=None, window=DEFAULT_READ_WINDOW, use_daemon=True, cache_blocks=EEPROM_BLOCKS,
+                 trace=None, replay=None, replay_timing=False):
 
-        ChannelsDict[channel_number] = [ name, rx_f, tx_f, rx_subtone, tx_subtone, tx_power, groups, bandwidth, modulation ]
+        if device is not None and image is not None:
+            raise NicFWError("device and image file used at once.")
 
-    file.close()
-    
-    # reset exit_info
-    exit_info = None
+        if image is not None and (trace is not None or replay is not None):
+            raise NicFWError("trace can't be used with image file.")
 
-    write_channels_from_dict(ChannelsDict)
+        if window < 1 or window > 32:
+            raise NicFWError("read window should be in the range from 1 to 32.")
 
-    sys.exit(0)
+        if device is None:
+            device = DEFAULT_DEVICE
 
+        if socket_path is None:
+            socket_path = DEFAULT_SOCKET_PATH.format(os.path.basename(device))
 
-# read and print specified chunk of blocks 
-def print_eeprom_blocks(start_address, end_address):
+        self.device = device
+        self.image = image              # EEPROM image file name
+        self.socket_path = socket_path
+        self.window = window            # number of EEPROM read requests kept in flight
+        self.use_daemon = use_daemon
+        self.trace = trace              # file recording all bytes on the wire
+        self.replay = replay            # trace file played instead of radio
+        self.replay_timing = replay_timing
 
-    disable_radio()
+        self._port = None               # serial port connected to radio (or daemon)
+        self._eeprom_image = None       # memory mapped EEPROM image used instead of radio
+        self.session_depth = 0          # number of currently opened (nested) radio sessions
+        self.written_blocks = {}        # blocks written since last verification (address: data)
+        self.block_cache = BlockCache(cache_blocks) # blocks already read from radio
+        self.stats = Stats()
 
-    for address in range(start_address,end_address):
-        data = get_eeprom_block(address)
-        hex_string = "{:03d} ".format(address) + "0x" + struct.pack('B', address).hex() + " | "
-        hex_string += ' '.join(struct.pack('B', x).hex() for x in data)
-        print(hex_string)
+    # serial port, opened on first use
+    @property
+    def port(self):
+
+        if self._port is None:
+            self.open()
+
+        return self._port
+
+    # memory mapped EEPROM image, None if radio is used
+    @property
+    def eeprom_image(self):
 
-    enable_radio()
+        if self.image is not None and self._eeprom_image is None:
+            self.open()
 
+        return self._eeprom_image
 
-bandplan_list = []
-bp = {}
+    def open(self):
 
-def read_eeprom_from_byte(start_byte, nbytes):
+        with self.stats.phase('open'):
+            self._open()
 
-    disable_radio()
+        if self._port is None:
+            return
 
-    data = bytearray()
+        # record bytes on the wire
+        if self.trace is not None:
+            try:
+                self._port = TracePort(self._port, self.trace)
+            except NicFWError:
+                self.close()
+                raise
 
-    sblock = start_byte//32 # from which block we should starat
-    sbyte = start_byte%32   # from which byte in block we should start
-    nblock = round(nbytes/32)+1   # how many block we need to read
+        # count bytes on the wire
+        self._port = StatsPort(self._port, self.stats)
 
-#    print("{} {} {}".format(sblock,sbyte,nblock))
+    def _open(self):
 
-    r = 0 # readed bytes
-    for block in range (0, nblock):
+        if self.image is not None:
 
-        block_data = get_eeprom_block(sblock+block)   # get block
+            if debug:
+                print("[DBG] Using '{}' image file...".format(self.image))
 
-        to_read = (nbytes-r)
+            # Try to map image file
+            try:
+                with open(self.image, "rb") as image_file:
+                    self._eeprom_image = mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                raise NicFWError("Could not open/read image file '{}'".format(self.image))
 
-        if to_read > (32 - sbyte):
-            chunk_size = (32 - sbyte)
+            if len(self._eeprom_image) != EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+                size = len(self._eeprom_image)
+                self.close()
+                raise NicFWError("image file '{}' has wrong size ({} but should be {} bytes).".format(self.image,size,EEPROM_BLOCKS*EEPROM_BLOCK_SIZE))
+
+            return
+
+        # recorded trace instead of radio
+        if self.replay is not None:
+            if debug:
+                print("[DBG] Replaying '{}' trace file...".format(self.replay))
+            self._port = ReplayPort(self.replay, self.replay_timing)
+            return
+
+        # use daemon, if it is running for this device
+        if self.use_daemon:
+            self._port = connect_daemon(self.socket_path)
+            if self._port is not None:
+                if debug:
+                    print("[DBG] Using daemon at '{}'...".format(self.socket_path))
+                return
+
+        import serial
+
+        if debug:
+            print("[DBG] Using '{}' device...".format(self.device))
+
+        # Try to open serial device
+        try:
+            self._port = serial.Serial(self.device, baudrate=38400, timeout=DEFAULT_SERIAL_TIMEOUT)
+        except serial.serialutil.SerialException:
+            raise NicFWError("problem occured when trying to open '{}' device".format(self.device))
+
+    def close(self):
+
+        if self._port is not None:
+            self._port.close()
+            self._port = None
+
+        if self._eeprom_image is not None:
+            self._eeprom_image.close()
+            self._eeprom_image = None
+
+    # check that radio (not image file) is used
+    def check_writable(self):
+        if self.image is not None:
+            raise NicFWError("only read actions can be used with image file.")
+
+    def write_cmd(self, cmd, check_ack=False):
+        self.check_writable()
+        self.port.write(cmd)
+        self.stats.count('commands')
+        if check_ack == True:
+            ack = self.port.read(1)
+            if ack != cmd:
+                self.stats.count('ack_errors')
+                raise NicFWError("Unable to communicate with nicFW -- there was no valid ACK for {} command ({} recaived).".format(cmd,ack))
+
+    def disable_radio(self):
+        with self.stats.phase('session'):
+            self.write_cmd(CMD_DISABLE_RADIO, check_ack=True)
+
+    def enable_radio(self):
+        with self.stats.phase('session'):
+            self.write_cmd(CMD_ENABLE_RADIO, check_ack=True)
+
+    def reset_radio(self):
+        self.write_cmd(CMD_RESET_RADIO)
+        self.block_cache.clear()
+
+    def enable_remote(self):
+        self.write_cmd(CMD_START_REMOTE_SESSION, check_ack=True)
+
+    def disable_remote(self):
+        self.write_cmd(CMD_END_REMOTE_SESSION, check_ack=True)
+
+    def flashlight(self, on):
+        if on:
+            self.write_cmd(CMD_FLASHLIGHT_ON)
         else:
-            chunk_size = to_read
+            self.write_cmd(CMD_FLASHLIGHT_OFF)
+
+    # push and release key (0-18)
+    # - key is held for hold_time and radio is left alone for release_time after release
+    #   (both default to push_time)
+    def send_key(self, key, push_time=DEFAULT_KEY_PUSH_TIME, hold_time=None, release_time=None):
+        self.check_writable()
+        if hold_time is None:
+            hold_time = push_time
+        if release_time is None:
+            release_time = push_time
+        # keys can change radio settings stored in EEPROM
+        self.block_cache.clear()
+        with self.stats.phase('keys'):
+            self.port.write([0x80|int(key)])
+            sleep(hold_time)
+            self.port.write([0xFF])
+            sleep(release_time)
+
+    # keep radio disabled for the time of EEPROM access
+    # - sessions can be nested, only the outermost one sends disable/enable commands
+    # - there is nothing to disable when EEPROM image file is used
+    @contextmanager
+    def session(self):
+
+        if self.session_depth == 0 and self.eeprom_image is None:
+            self.disable_radio()
+        self.session_depth += 1
 
-        for block_byte in range(sbyte, sbyte+chunk_size):
-            data.append(block_data[block_byte])
-            r += 1
+        try:
+            yield
+        except BaseException:
+            # still try to enable the radio, but report the error which broke the session
+            self.session_depth -= 1
+            if self.session_depth == 0 and self.eeprom_image is None:
+                try:
+                    self.enable_radio()
+                except (NicFWError, OSError) as e:
+                    print("[WARN] radio could not be enabled again ({})".format(e), file=sys.stderr)
+            raise
+        self.session_depth -= 1
+        if self.session_depth == 0 and self.eeprom_image is None:
+            self.enable_radio()
+
+    # keep remote control session opened for the time of sending keys
+    @contextmanager
+    def remote_session(self):
+
+        self.enable_remote()
 
-        sbyte = 0 # if there will be next block to read, we will start from first byte
+        try:
+            yield
+        except BaseException:
+            try:
+                self.disable_remote()
+            except (NicFWError, OSError) as e:
+                print("[WARN] remote session could not be closed ({})".format(e), file=sys.stderr)
+            raise
+        self.disable_remote()
 
-    return(data)
+    # get eeprom block (32 bytes), from cache if it has been already read
+    def get_eeprom_block(self, address):
 
-    enable_radio()
+        # offline mode -- take block straight from image file
+        if self.eeprom_image is not None:
+            return self.eeprom_image[address*EEPROM_BLOCK_SIZE:(address+1)*EEPROM_BLOCK_SIZE]
 
-def check_str_in_array(value,values_array,desc):
-    for s in values_array:
-        if s.lower() == value.lower():
-            return str
-    print("[ERR] wrong {} value '{}', allowed: {}".format(desc, value,', '.join(values_array)))
-    exit(2)
+        data = self.block_cache.get(address)
 
+        if data is None:
+            data = self.read_eeprom_block(address)
+            self.block_cache.put(address, data)
 
-# decode and prints bandplan
-def decode_band_plan(buf):
+        return data
 
-    print("Band Plan")
-    print("{:15s} {:13s} {:09s} {:12s} {:14s} {:10s} {:9s}".format("Start Frequency",'End frequency','Max Power','Modulation','Bandwidth', 'Tx Allowed', 'Wrap'))
+    # read eeprom block (32 bytes) from radio
+    def read_eeprom_block(self, address):
 
-    for i in range (0,20):
-        item = buf[(i*10):(i*10+10)]
-        bp['start_f']     = int.from_bytes(item[0:4], 'little')
-        bp['end_f']       = int.from_bytes(item[4:8], 'little')
-        bp['bandwidth']   = (item[9] &0b11100000) >> 5
-        bp['modulation']  = (item[9] &0b00011100) >> 2
-        bp['tx']          = (item[9] &0b00000010) >> 1
-        bp['wrap']        = (item[9] &0b00000001)
-        bp['power']       = item[8]
+        with self.stats.phase('read'):
 
-        print ("{:15d} {:13d} {:9d} {:12s} {:14s} {:10s} {:9s}".format(
-            bp['start_f'],
-            bp['end_f'],
-            bp['power'],
-            bandplan_mod[bp['modulation']],
-            bandplan_bw[bp['bandwidth']],
-            NoYes[bp['tx']],
-            NoYes[bp['wrap']]
-        ))
+            self.stats.count('commands')
+            self.stats.count('block_reads')
 
+            # command with its argument in one write, whole response (ACK, data, checksum) in one read
+            self.port.write(CMD_READ_EEPROM + bytes([address]))
+            response = self.port.read(EEPROM_BLOCK_SIZE+2)
+            ack = response[0:1]
 
-fm = {}
+            if ack != CMD_READ_EEPROM:
+                self.stats.count('ack_errors')
+                self.flush_input()      # drop the rest of response, so session can be closed
+                raise NicFWError("Unable to communicate with nicFW -- there was no valid ACK for {} command ({} recaived).".format(CMD_READ_EEPROM,ack))
 
-def decode_fmtuner(buf1, buf2):
+            data = response[1:EEPROM_BLOCK_SIZE+1]
+            checksum_r = response[EEPROM_BLOCK_SIZE+1:]
 
-    print ("FM Tuner settings")
-    print ("{:9s} {:7s}".format("Frequency",'Band'))
+        if checksum_r != calc_checksum(data):
+            self.stats.count('checksum_errors')
+            self.flush_input()      # drop late/remaining bytes, so session can be closed
+            raise NicFWError("received data checksum mismatch!")
+        if debug:
+            print ("[DBG] received checksum OK")
 
-    for i in range (0,20):
-        freq_item = buf1[(i*4):(i*4+4)]
-        band_item = buf2[i]
-        fm['freq']  = int.from_bytes(freq_item[0:4], 'little')
-        fm['band']  = band_item
+        return data
 
-        print ("{:9d} {:7s}".format(
-            fm['freq'],
-            fm_band[fm['band']],
-        ))
+    # drop all pending input bytes (waits until there is no more data on the line)
+    # - the final empty read is expected, it isn't counted as timeout
+    def flush_input(self):
+        self.port.draining = True
+        try:
+            while len(self.port.read(max(1, self.port.in_waiting))) > 0:
+                pass
+        finally:
+            self.port.draining = False
 
+    # read eeprom blocks, yields (address, data) for each block
+    # - cached blocks are taken from cache, the rest is read from radio in single radio session
+    #   (there is no session at all when all blocks are cached)
+    # - window overrides read window of radio
+    def iter_eeprom_blocks(self, addresses, window=None):
 
-sp = {}
+        addresses = list(addresses)
 
-def decode_scan_presets(buf):
+        if self.eeprom_image is not None:
+            for address in addresses:
+                yield address, self.get_eeprom_block(address)
+            return
 
-    print ("Scan Presets")
-    print ("{:15s} {:13s} {:7s} {:12s} {:5s} {:9s} {:9s} {:6s} {:10s}".format("Start Frequency",'End Frequency','Squelch','Squelch Tail','Step','Scan Hold','Scan Tail','Update','Modulation'))
+        cached = { address: self.block_cache.get(address) for address in set(addresses) }
+        missing = [ address for address in addresses if cached[address] is None ]
 
-    for i in range (0,10):
-        sp_item = buf[(i*14):(i*14+14)]
-        sp['start_freq']  = int.from_bytes(sp_item[0:4], 'little')      # 4 bytes for frequency
-        sp['steps']  = int.from_bytes(sp_item[4:6], 'little')           # 2 bytes for scan steps
-        sp['squelch'] = sp_item[6] + 1; # +1 because squelch can be 1-9 (so 0-9 in byte)
-        sp['squelch_tail'] = sp_item[7]
-        sp['step']  = int.from_bytes(sp_item[8:10], 'little')
-        sp['scan_hold'] = sp_item[10]
-        sp['scan_tail'] = sp_item[11]
-        sp['update'] = sp_item[12]
-        sp['modulation'] = sp_mod[sp_item[13]]
+        radio_blocks = self.iter_radio_blocks(missing, window)
 
-        sp['end_freq'] = sp['start_freq'] + (sp['steps'] * sp['step'])
+        for address in addresses:
 
-        print ("{:15d} {:13d} {:7d} {:12d} {:5} {:9d} {:9d} {:6d} {:10s}".format(
-            sp['start_freq'],
-            sp['end_freq'],
-            sp['squelch'],
-            sp['squelch_tail'],
-            sp['step'],
-            sp['scan_hold'],
-            sp['scan_tail'],
-            sp['update'],
-            sp['modulation'],
-        ))
+            data = cached[address]
 
+            if data is None:
+                data = next(radio_blocks)[1]
+                self.block_cache.put(address, data)
 
+            yield address, data
 
-# print EEPROM content
-if args.show_eeprom != False:
-    print_eeprom_blocks(0,255)
-    exit (0)
+        # finish radio session
+        for block in radio_blocks:
+            pass
 
-# print Band Plan
-if args.show_bandplan != False:
-    bandplan_bytes = read_eeprom_from_byte(208*32+2,10*20)
-    decode_band_plan(bandplan_bytes)
-    sys.exit(0)
+    # read eeprom blocks from radio in single radio session, yields (address, data) for each block
+    # - up to window read requests are sent ahead, responses are matched by order
+    # - if radio falls behind (timeout, bad ACK or checksum), remaining blocks are
+    #   read in stop-and-wait mode
+    def iter_radio_blocks(self, addresses, window=None):
 
-# print FM tuner channels
-if args.show_fmtuner != False:
-    # bank 200: - squelching byte 10, HT monitoring byte 11
-    fm_freq_bytes = read_eeprom_from_byte(204*32,4*20) # frequency each 4 bytes
-    fm_band_bytes = read_eeprom_from_byte(206*32+16,1*20) # band each 1 bytes so 20 bytes starting from bank 25, byte 16
-    if debug:
-        print("fm_freq_bytes:",' '.join(struct.pack('B', x).hex() for x in fm_freq_bytes))
-        print("fm_band_bytes:",' '.join(struct.pack('B', x).hex() for x in fm_band_bytes))
-    decode_fmtuner(fm_freq_bytes,fm_band_bytes)
-    sys.exit(0)
-
-# print Scan Presets
-if args.show_scan_presets != False:
-    scan_presets_bytes = read_eeprom_from_byte(216*32,14*10)
-    if debug:
-        print("scan_presets_bytes:",' '.join(struct.pack('B', x).hex() for x in scan_presets_bytes))
-    decode_scan_presets(scan_presets_bytes)
-    sys.exit(0)
+        if not addresses:
+            return
 
+        if window is None:
+            window = self.window
 
-bandplan=[]
+        with self.session():
 
-# import Band Plan from file
-if args.import_bandplan != None:
+            if window == 1:
+                for address in addresses:
+                    yield address, self.read_eeprom_block(address)
+                return
 
-    try:
-        file = open(args.import_bandplan, "r")
-    except OSError:
-        print("[ERR] Could not open/read file '{}'".format(args.import_csv))
-        sys.exit(2)
-    
-    channels = {}
+            sent = 0        # number of sent requests
+            received = 0    # number of received blocks
 
-    lcount = 0
+            while received < len(addresses):
 
-    for line in file:
+                with self.stats.phase('read'):
 
-        line = line.rstrip('\n')
+                    # keep window full
+                    while sent < len(addresses) and sent-received < window:
+                        self.stats.count('commands')
+                        self.stats.count('block_reads')
+                        self.port.write(CMD_READ_EEPROM + bytes([addresses[sent]]))
+                        sent += 1
 
-        lcount += 1
+                    # response: ACK, 32 bytes of data, checksum
+                    response = self.port.read(EEPROM_BLOCK_SIZE+2)
+                    ack = response[0:1]
+                    data = response[1:EEPROM_BLOCK_SIZE+1]
+                    checksum_r = response[EEPROM_BLOCK_SIZE+1:]
 
-        # skip first line (header)
-        if lcount == 1:
-            continue
-        
-        # split line data
-        line_data = re.findall(r'\S+',line)
-
-        print (line_data)
-        # check array size
-        if len(line_data) != 7:
-            print("[ERR] line {} has incorrect number of fields".format(lcount))
-            sys.exit(2)
+                if ack != CMD_READ_EEPROM or checksum_r != calc_checksum(data):
+                    if debug:
+                        print("[DBG] pipelined read of block {} failed, falling back to stop-and-wait".format(addresses[received]))
+                    if ack != CMD_READ_EEPROM:
+                        self.stats.count('ack_errors')
+                    else:
+                        self.stats.count('checksum_errors')
+                    self.stats.count('retries', len(addresses)-received)
+                    with self.stats.phase('read'):
+                        self.flush_input()
+                    for address in addresses[received:]:
+                        yield address, self.read_eeprom_block(address)
+                    return
 
-        # set additional info on check fail
-        exit_info = "[ERR] import failed on line {}".format(lcount)
+                yield addresses[received], data
+                received += 1
 
-        # check and import bandplan entry
-        bp['start_f']     = check_frequency(line_data[0],zero_allowed=True)
-        bp['end_f']       = check_frequency(line_data[1],zero_allowed=True)
-        #if power != 'Ignore'
-        bp['max_power']   = check_power(line_data[2])
-        bp['modulation']  = check_str_in_array(line_data[3],bandplan_mod,"Modulation")
-        bp['bandwidth']   = check_str_in_array(line_data[4],bandplan_bw,"Bandplan")
-        bp['tx']          = check_str_in_array(line_data[5],NoYes,"TX allowed")
-        bp['wrap']        = check_str_in_array(line_data[6],NoYes,"Wrap")
+    # read chunk of consecutive eeprom blocks in single radio session
+    def read_eeprom_blocks(self, start_address, nblocks):
 
-        if debug:       
-            print ("[DBG] file read: {} {} {} {} {} {} {}".format(bp['start_f'],bp['end_f'],bp['max_power'],bp['modulation'],bp['bandwidth'],bp['tx']),bp['rap'])
+        data = bytearray()
 
+        for address, block_data in self.iter_eeprom_blocks(range(start_address, start_address+nblocks)):
+            data.extend(block_data)
 
-        # check start freq < end frequency
-        if bp['start_f'] >= bp['end_f']:
-            if  bp['start_f'] != 0: # zero is allowed == bandplan entry disabled
-                print("[ERR] Start frequency should be smaller that End frequency")
-                exit(2)
+        return data
 
-    #TODO
-    print("[INF] Function is not implemented yet.")
+    # read many byte ranges (list of (start byte, size)) in single radio session
+    # - union of covered blocks is read in one pass, every block only once
+    # - returns list of ranges data
+    def read_eeprom_ranges(self, ranges):
 
-    file.close()
-    
-    # reset exit_info
-    exit_info = None
+        blocks = set()
+        for start_byte, nbytes in ranges:
+            if start_byte < 0 or nbytes < 1 or start_byte+nbytes > EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+                raise NicFWError("range {}+{} is out of EEPROM.".format(start_byte, nbytes))
+            blocks.update(range(start_byte//EEPROM_BLOCK_SIZE, (start_byte+nbytes-1)//EEPROM_BLOCK_SIZE+1))
 
-    sys.exit(0)
+        block_data = dict(self.iter_eeprom_blocks(sorted(blocks)))
 
+        result = []
 
-#####################################
-# REMOTE CONTROL
-#####################################
-# 10 - MENU         0x0A
-# 11 - UP           0x0B
-# 12 - DOWN         0x0C
-# 13 - EXIT V/M     0x0D
-# 14 - *            0x0E
-# 15 - #            0x0F
-# 16 - PTT          0x10
-# 17 - FN1/PTT2     0x11
-# 18 - FN2/f-light  0x12
+        for start_byte, nbytes in ranges:
+            sblock = start_byte//EEPROM_BLOCK_SIZE
+            eblock = (start_byte+nbytes-1)//EEPROM_BLOCK_SIZE
+            data = b''.join(bytes(block_data[block]) for block in range(sblock, eblock+1))
+            sbyte = start_byte%EEPROM_BLOCK_SIZE
+            result.append(data[sbyte:sbyte+nbytes])
 
-if args.key:
-#    write_cmd(CMD_START_REMOTE_SESSION)
-    keys = args.key.split(",")
-    keyArr = []
+        return result
 
-    # check if string can be converted to float (has only digits separated with optional '.')
-    def is_float(string):
-        try:
-            float(string)
-            return True
-        except ValueError:
-            return False
+    # read named regions of EEPROM_LAYOUT in single pass, returns dict (name: data)
+    def read_eeprom_regions(self, names):
 
-    # isolate numeric keys and put it to keyArr[] array (so 12345 will be [1, 2, 3, 4, 5] and will be send as separate keys
-    for key in keys:
-        if is_float(key):
-            for i in range(0,len(key)):
-                keyArr.append(key[i])
-        else:
-            keyArr.append(key)
+        for name in names:
+            if name not in EEPROM_LAYOUT:
+                raise NicFWError("unknown EEPROM region '{}', allowed: {}".format(name, ', '.join(EEPROM_LAYOUT)))
 
-    for key in keyArr:
-        if key.lower() in [ 'blue', 'menu' ]:
-            key = 10
-        elif key.lower() == 'up':
-            key = 11
-        elif key.lower() == 'down':
-            key = 12
-        elif key.lower() in [ 'red', 'back' ]:
-            key = 13
-        elif key.lower() in [ '*', 'star', '.' ]:
-            key = 14
-        elif key.lower() == '#':
-            key = 15
-        elif key.lower() == 'ptt':
-            key = 16
-        elif key.lower() in [ 'f1', 'ptt2' ]:
-            key = 17
-        elif key.lower() == 'f2':
-            key = 18
-        elif len(key) == 1:
-            if ord(key) < ord('0') or ord(key) > ord('9'):
-               print("[ERR] Unsupported key: '{}'".format(key))
-               sys.exit(2)
+        return dict(zip(names, self.read_eeprom_ranges([ EEPROM_LAYOUT[name] for name in names ])))
+
+    # read nbytes of eeprom starting from start_byte
+    def read_eeprom_from_byte(self, start_byte, nbytes):
+        return self.read_eeprom_ranges([ (start_byte, nbytes) ])[0]
+
+    # write eeprom block (32 bytes)
+    def write_eeprom_block(self, address, data_bytes):
+
+        self.check_writable()
+
+        checksum = calc_checksum(data_bytes)
+
+        if debug:
+            print("[DBG] bytes to write:{} checksum:{}".format(data_bytes,checksum))
+
+        self.block_cache.invalidate(address)
+
+        with self.session():
+            with self.stats.phase('write'):
+                self.stats.count('commands')
+                self.stats.count('block_writes')
+                self.port.write(CMD_WRITE_EEPROM + bytes([address]) + bytes(data_bytes) + checksum)
+                ack = self.port.read(1)
+
+        if ack == CMD_WRITE_EEPROM:
+            if debug:
+                print("[DBG] write OK")
         else:
-            print("[ERR] Unsupported key: '{}'".format(key))
-            sys.exit(2)
-        
+            self.stats.count('ack_errors')
+            self.flush_input()      # drop late/remaining bytes, so session can be closed
+            raise NicFWError("invalid ACK after write, something went wrong!")
+
+        self.written_blocks[address] = bytes(data_bytes)
+
+    # write many regions (list of (start byte, data)) to eeprom in single radio session
+    # - all blocks covered by regions are read first (one pass), regions are merged into them,
+    #   so partial blocks keep the rest of their content and block touched by many regions
+    #   is written only once
+    # - unchanged blocks are not written
+    # - returns number of written and skipped blocks
+    def write_eeprom_regions(self, regions):
+
+        blocks = set()
+        for start_byte, data in regions:
+            if start_byte < 0 or start_byte+len(data) > EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+                raise NicFWError("region {}+{} is out of EEPROM.".format(start_byte, len(data)))
+            blocks.update(range(start_byte//EEPROM_BLOCK_SIZE, (start_byte+len(data)-1)//EEPROM_BLOCK_SIZE+1))
+
+        written = 0
+        skipped = 0
+
+        with self.session():
+
+            current = dict(self.iter_eeprom_blocks(sorted(blocks)))
+
+            target = { block: bytearray(data) for block, data in current.items() }
+
+            for start_byte, data in regions:
+                for i in range(len(data)):
+                    address = start_byte+i
+                    target[address//EEPROM_BLOCK_SIZE][address%EEPROM_BLOCK_SIZE] = data[i]
+
+            for block in sorted(blocks):
+
+                data_w = bytes(target[block])
+
+                if current[block] == data_w:
+                    skipped += 1
+                    continue
+
+                self.write_eeprom_block(block, data_w)
+                written += 1
+
+        return written, skipped
+
+    # write data to eeprom starting from start_byte (see write_eeprom_regions)
+    def write_eeprom_from_byte(self, start_byte, data):
+        return self.write_eeprom_regions([ (start_byte, data) ])
+
+    # read back blocks written since last verification in one (pipelined) pass
+    # - returns list of addresses which don't hold written data
+    def verify_written_blocks(self):
+
+        written_blocks = self.written_blocks
+        self.written_blocks = {}
+
+        if not written_blocks:
+            return []
+
+        mismatched = []
+
+        # always pipelined, at least VERIFY_READ_WINDOW requests in flight
+        window = max(self.window, VERIFY_READ_WINDOW)
+
+        for address, data in self.iter_eeprom_blocks(sorted(written_blocks), window):
+            if data != written_blocks[address]:
+                mismatched.append(address)
+
+        return mismatched
+
+    # read full EEPROM content (all blocks) in single radio session
+    def read_eeprom_image(self, progress=print):
+
+        image = bytearray()
+
+        for address, data in self.iter_eeprom_blocks(range(0, EEPROM_BLOCKS)):
+
+            image.extend(data)
+
+            # show reading progress
+            if progress and (address+1)%32 == 0:
+                progress("reading block {:03d}...{:03d} ({:3.0f})%.".format(address-31,address,(address+1)/EEPROM_BLOCKS*100))
+
+        if len(image) != EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+            raise NicFWError("read image has wrong size ({} but should be {} bytes).".format(len(image),EEPROM_BLOCKS*EEPROM_BLOCK_SIZE))
+
+        return image
+
+
+######################################################################################
+# CHANNELS
+######################################################################################
+
+# channel record: rx_f, tx_f, rx_subtone, tx_subtone, tx_power, groups (4 nibbles), mod_bw, reserved, name
+CHANNEL_STRUCT = struct.Struct("<IIHHBHB4s12s")
+CHANNEL_FIELDS = ( 'rx_f', 'tx_f', 'rx_subtone', 'tx_subtone', 'tx_power', 'groups', 'mod_bw', 'reserved', 'name' )
+EMPTY_BLOCK = bytes([255]*EEPROM_BLOCK_SIZE)
+
+# single channel
+# - groups are kept in packed 2 bytes form (4 nibbles, as in channel record)
+# - modulation and bandwidth are kept as indexes to MODULATIONS/BANDWIDTHS
+class Channel:
+
+    __slots__ = ( 'number', 'name', 'rx_f', 'tx_f', 'rx_subtone', 'tx_subtone', 'tx_power', 'groups', 'modulation', 'bandwidth' )
+
+    def __init__(self, number, name="", rx_f=0, tx_f=0, rx_subtone=0, tx_subtone=0, tx_power=0, groups=0, modulation=0, bandwidth=0):
+        self.number = number
+        self.name = name
+        self.rx_f = rx_f
+        self.tx_f = tx_f
+        self.rx_subtone = rx_subtone
+        self.tx_subtone = tx_subtone
+        self.tx_power = tx_power
+        self.groups = groups
+        self.modulation = modulation
+        self.bandwidth = bandwidth
+
+    # default values for the newly created channel
+    @classmethod
+    def default(cls, number):
+        return cls(number, name="CH-{:03n}".format(number), rx_f=14495000, tx_f=14495000, modulation=0, bandwidth=1)
+
+    # decode channel record, returns None for empty channel (record filled with 0xff)
+    @classmethod
+    def from_bytes(cls, number, data):
+
+        if len(data) != EEPROM_BLOCK_SIZE:
+            raise NicFWError("received channel data has wrong size ({} but should be {} bytes).".format(len(data),EEPROM_BLOCK_SIZE))
+
+        if data == EMPTY_BLOCK:
+            return None
+
+        rx_f, tx_f, rx_subtone, tx_subtone, tx_power, groups, mod_bw, reserved, name = CHANNEL_STRUCT.unpack(data)
+
+        return cls(number,
+            name=name.decode('utf-8', 'replace').rstrip('\0'),
+            rx_f=rx_f,
+            tx_f=tx_f,
+            rx_subtone=rx_subtone,
+            tx_subtone=tx_subtone,
+            tx_power=tx_power,
+            groups=groups,
+            modulation=(mod_bw >> 1) & 0b00000011,
+            bandwidth=mod_bw & 0b00000001)
+
+    # encode channel record
+    def to_bytes(self):
+
+        name = self.name.encode()
+        if len(name) > 12:
+            raise NicFWError("encoded name has wrong size ({} but should be up to {} bytes).".format(len(name),12))
+
+        mod_bw = 0b11111000 | (self.modulation<<1) | self.bandwidth # add reserved bits as 1
+
+        return CHANNEL_STRUCT.pack(self.rx_f, self.tx_f, self.rx_subtone, self.tx_subtone, self.tx_power, self.groups, mod_bw, bytes([255]*4), name)
+
+    @property
+    def groups_str(self):
+        return group_an2s(group_b2an(self.groups.to_bytes(2, 'little')))
+
+    @groups_str.setter
+    def groups_str(self, groups_str):
+        self.groups = int.from_bytes(group_s2b(groups_str), 'little')
 
-        port.write([0x80|int(key)])
-        sleep(DEFAULT_KEY_PUSH_TIME)
-        port.write([0xFF])
-        sleep(DEFAULT_KEY_PUSH_TIME)
+    @property
+    def modulation_str(self):
+        return MODULATIONS[self.modulation]
 
-    print("done.")
-#    port.write(CMD_END_REMOTE_SESSION)
-    sys.exit(0)
+    @modulation_str.setter
+    def modulation_str(self, modulation):
+        if modulation.upper() not in MODULATIONS_UP:
+            raise NicFWError("Wrong modulation value ({}).".format(modulation))
+        self.modulation = MODULATIONS_UP.index(modulation.upper())
+
+    @property
+    def bandwidth_str(self):
+        return BANDWIDTHS[self.bandwidth]
+
+    @bandwidth_str.setter
+    def bandwidth_str(self, bandwidth):
+        if bandwidth.upper() not in BANDWIDTHS_UP:
+            raise NicFWError("Wrong bandwidth value ({}).".format(bandwidth))
+        self.bandwidth = BANDWIDTHS_UP.index(bandwidth.upper())
+
+MODULATIONS_UP = [ m.upper() for m in MODULATIONS ]
+BANDWIDTHS_UP = [ b.upper() for b in BANDWIDTHS ]
+
+
+# print channel data
+def print_channel(ch):
+
+    print ("{:10s} : CH-{:03d}".format("channel", ch.number))
+    print ("{:10s} : {}".format("name", ch.name))
+    print ("{:10s} : {}".format("RX freq", ch.rx_f))
+    print ("{:10s} : {}".format("TX freq", ch.tx_f))
+    print ("{:10s} : {}".format("RX subtone", ch.rx_subtone))
+    print ("{:10s} : {}".format("TX subtone", ch.tx_subtone))
+    print ("{:10s} : {}".format("TX power", ch.tx_power))
+    print ("{:10s} : {}".format("group", ch.groups_str))
+    print ("{:10s} : {}".format("bandwidth", ch.bandwidth_str))
+    print ("{:10s} : {}".format("modulation", ch.modulation_str))
+
+
+######################################################################################
+# CHANNEL TABLE
+######################################################################################
+
+numpy = None
+
+# import numpy on first use, returns None if it is not installed
+def get_numpy():
+
+    global numpy
+
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
 
+    if numpy is False:
+        return None
+
+    return numpy
+
+# numpy structured dtype of channel record
+def channel_dtype():
+    return get_numpy().dtype([
+        ('rx_f', '<u4'), ('tx_f', '<u4'), ('rx_subtone', '<u2'), ('tx_subtone', '<u2'), ('tx_power', 'u1'),
+        ('groups', '<u2'), ('mod_bw', 'u1'), ('reserved', 'S4'), ('name', 'S12')
+    ])
+
+# columnar table of channels, decoded from/encoded to contiguous buffer of 32 bytes channel records
+# - every column is a list (or numpy array, when decoded with use_numpy=True), index 0 is channel 1
+# - empty[i] is True for unused channel (record filled with 0xff)
+class ChannelTable:
+
+    def __init__(self, columns, empty):
+        self.columns = columns
+        self.empty = empty
+
+    def __len__(self):
+        return len(self.empty)
+
+    # decode all channel records from buffer in one pass
+    @classmethod
+    def from_bytes(cls, buf, use_numpy=False):
+
+        if len(buf) % EEPROM_BLOCK_SIZE != 0:
+            raise NicFWError("channel buffer size ({}) is not multiple of {} bytes.".format(len(buf),EEPROM_BLOCK_SIZE))
+
+        if use_numpy and get_numpy() is not None:
+            records = numpy.frombuffer(bytes(buf), dtype=channel_dtype())
+            columns = { field: records[field] for field in CHANNEL_FIELDS }
+            raw = numpy.frombuffer(bytes(buf), dtype='u1').reshape(-1, EEPROM_BLOCK_SIZE)
+            empty = list((raw == 255).all(axis=1))
+            return cls(columns, empty)
+
+        rows = list(zip(*CHANNEL_STRUCT.iter_unpack(buf)))
+        if len(rows) == 0:
+            rows = [ [] for field in CHANNEL_FIELDS ]
+        columns = { field: list(column) for field, column in zip(CHANNEL_FIELDS, rows) }
+        empty = [ buf[offset:offset+EEPROM_BLOCK_SIZE] == EMPTY_BLOCK for offset in range(0, len(buf), EEPROM_BLOCK_SIZE) ]
+
+        return cls(columns, empty)
+
+    # build table from channels dict (channel number: Channel), channels which are not in dict are empty
+    @classmethod
+    def from_channels(cls, channels, count=CHANNELS_COUNT):
+
+        return cls.from_bytes(channels_to_bytes(channels, count))
+
+    # encode whole table to buffer of channel records
+    def to_bytes(self):
+
+        buf = bytearray(EMPTY_BLOCK*len(self))
+
+        rows = zip(*(self.columns[field] for field in CHANNEL_FIELDS))
+        for i, row in enumerate(rows):
+            if not self.empty[i]:
+                CHANNEL_STRUCT.pack_into(buf, i*EEPROM_BLOCK_SIZE, *row)
+
+        return buf
+
+    # channel at index i (channel number i+1), None if it is empty
+    def channel(self, i):
+
+        if self.empty[i]:
+            return None
+
+        mod_bw = int(self.columns['mod_bw'][i])
+
+        return Channel(i+1,
+            name=self.name(i),
+            rx_f=int(self.columns['rx_f'][i]),
+            tx_f=int(self.columns['tx_f'][i]),
+            rx_subtone=int(self.columns['rx_subtone'][i]),
+            tx_subtone=int(self.columns['tx_subtone'][i]),
+            tx_power=int(self.columns['tx_power'][i]),
+            groups=int(self.columns['groups'][i]),
+            modulation=(mod_bw >> 1) & 0b00000011,
+            bandwidth=mod_bw & 0b00000001)
+
+    def name(self, i):
+        return bytes(self.columns['name'][i]).decode('utf-8', 'replace').rstrip('\0')
+
+    def groups_str(self, i):
+        return group_an2s(group_b2an(int(self.columns['groups'][i]).to_bytes(2, 'little')))
+
+    def modulation(self, i):
+        return MODULATIONS[(int(self.columns['mod_bw'][i]) >> 1) & 0b00000011]
+
+    def bandwidth(self, i):
+        return BANDWIDTHS[int(self.columns['mod_bw'][i]) & 0b00000001]
+
+
+# encode channels dict (channel number: Channel) to buffer of channel records
+# - channels which are not in dict are filled with 0xff
+def channels_to_bytes(channels, count=CHANNELS_COUNT):
+
+    buf = bytearray(EMPTY_BLOCK*count)
+
+    for channel_number, ch in channels.items():
+        offset = (channel_number-1)*EEPROM_BLOCK_SIZE
+        buf[offset:offset+EEPROM_BLOCK_SIZE] = ch.to_bytes()
+
+    return buf
+
+
+# read channel from radio, returns None if channel is empty
+def get_channel(radio, channel_number):
+
+    data = radio.read_eeprom_blocks(CHANNELS_BLOCK+channel_number-1, 1)
+
+    if data == b'':
+        raise NicFWError("received empy channel data!")
+
+    return Channel.from_bytes(channel_number, data)
+
+
+# write channel bytes to radio
+def write_channel_bytes(radio, channel_number, data_bytes):
+    radio.write_eeprom_block(CHANNELS_BLOCK+channel_number-1,data_bytes)
+
+# apply modifiers to channel, print and write it to radio
+def write_channel(radio, ch, **modifiers):
+
+    apply_channel_modifiers(ch, **modifiers)
+
+    print_channel(ch)
+
+    write_channel_bytes(radio, ch.number, ch.to_bytes())
+
+# set channel fields to validated modifiers values (None keeps current value)
+def apply_channel_modifiers(ch, name=None, rx=None, tx=None, tx_ctcss=None, rx_ctcss=None, power=None, groups=None, modulation=None, bandwidth=None):
+
+    if name is not None:
+        ch.name = check_name(name)
+    else:
+        ch.name = check_name(ch.name)
+
+    if rx is not None:
+        ch.rx_f = check_frequency(rx)
+    if tx is not None:
+        ch.tx_f = check_frequency(tx)
+    if tx_ctcss is not None:
+        ch.tx_subtone = check_subtone(tx_ctcss)
+    if rx_ctcss is not None:
+        ch.rx_subtone = check_subtone(rx_ctcss)
+    if power is not None:
+        ch.tx_power = check_power(power)
+    if groups is not None:
+        ch.groups_str = check_groups(groups)
+    if modulation is not None:
+        ch.modulation_str = check_modulation(modulation)
+    if bandwidth is not None:
+        ch.bandwidth_str = check_bandwidth(bandwidth)
+
+# apply the same modifiers to many channels, all in single radio session
+# - channels are given by numbers and/or find query (both have to match), None means any
+# - channels are read in one (pipelined) pass, only changed blocks are written
+# - empty channels are skipped
+# - returns updated channels, number of written blocks and number of skipped empty channels
+def update_channels(radio, numbers, query, modifiers, progress=print):
+
+    with radio.session():
+
+        if query is not None:
+            conditions = parse_find_query(query)
+            index = ChannelIndex.from_radio(radio)
+            found = index.find(conditions)
+            if numbers is not None:
+                found = sorted(set(found) & set(numbers))
+            channels = [ index.table.channel(number-1) for number in found ]
+            empty = 0
+        else:
+            addresses = [ CHANNELS_BLOCK+number-1 for number in numbers ]
+            channels = [ Channel.from_bytes(address-CHANNELS_BLOCK+1, data) for address, data in radio.iter_eeprom_blocks(addresses) ]
+            empty = channels.count(None)
+            channels = [ ch for ch in channels if ch is not None ]
+
+        regions = []
+        for ch in channels:
+            apply_channel_modifiers(ch, **modifiers)
+            progress(channel_line(ch))
+            regions.append(((CHANNELS_BLOCK+ch.number-1)*EEPROM_BLOCK_SIZE, ch.to_bytes()))
+
+        written, _ = radio.write_eeprom_regions(regions)   # unchanged blocks are not reported
+
+    return channels, written, empty
+
+# remove channel from radio
+def remove_channel(radio, channel_number):
+
+    data_w = bytearray([255]*32) # fill up with 0xff
+    write_channel_bytes(radio, channel_number, data_w)
+
+# import journal: target channels hash and number of the last confirmed channel
+# - written before first radio write, every JOURNAL_INTERVAL channels and when import fails,
+#   removed when import is finished
+JOURNAL_MAGIC = "nicFWutil-journal"
+JOURNAL_INTERVAL = 11
+
+def write_journal(file, target_hash, channel_number):
+    with open(file, "w") as f:
+        f.write("{} {} {}\n".format(JOURNAL_MAGIC, target_hash, channel_number))
+
+# journal is best-effort, returns False (with warning) if it can't be written
+def save_journal(file, target_hash, channel_number):
+
+    try:
+        write_journal(file, target_hash, channel_number)
+    except OSError as e:
+        print("[WARN] could not write journal file '{}' ({}), interrupted import can't be resumed.".format(file, e))
+        return False
+
+    return True
+
+# returns number of the last confirmed channel
+def read_journal(file, target_hash):
+
+    try:
+        with open(file, "r") as f:
+            fields = f.read().split()
+    except OSError:
+        raise NicFWError("Could not open/read journal file '{}', run import without --resume.".format(file))
+
+    if len(fields) != 3 or fields[0] != JOURNAL_MAGIC or not fields[2].isnumeric():
+        raise NicFWError("journal file '{}' is corrupted, run import without --resume.".format(file))
+
+    if fields[1] != target_hash:
+        raise NicFWError("journal file '{}' was written for different channels, run import without --resume.".format(file))
+
+    return min(int(fields[2]), CHANNELS_COUNT)
+
+# journal file name for CSV import, None for stdin
+def import_journal_name(csv_file, device=None):
+
+    if csv_file == "-":
+        return None
+
+    if device is not None:
+        return fleet_file_name(csv_file+".journal", device)
+
+    return csv_file+".journal"
+
+# writes previously generated (file import) channels dict (channel number: Channel) to radio
+# - only channel blocks which differ from current radio content are written
+# - if journal file is given, progress is recorded in it, so interrupted import can be
+#   continued with resume=True: all channels are read with one bulk read, confirmed ones
+#   are verified and writing continues from the first channel which doesn't match (still
+#   skipping unchanged blocks)
+# - journal I/O problems are only reported, import goes on without journal
+# - returns number of written and skipped blocks
+def write_channels_from_dict(radio, channels, progress=print, journal=None, resume=False):
+
+    written = 0
+    skipped = 0
+
+    # encode all channels at once, channels not in dictionary are overwritten with 0xff
+    with radio.stats.phase('decode'):
+        target_bytes = channels_to_bytes(channels)
+    target_hash = hashlib.sha256(target_bytes).hexdigest()
+
+    if resume:
+        if journal is None:
+            raise NicFWError("resume needs journal file.")
+        confirmed = read_journal(journal, target_hash)
+    else:
+        confirmed = 0
+
+    # make sure journal can be written before radio is touched
+    if journal is not None and not save_journal(journal, target_hash, confirmed):
+        journal = None
+
+    last_channel = confirmed
+
+    try:
+        with radio.session():
+
+            # read all channels at once, to compare them with imported ones
+            current_bytes = radio.read_eeprom_blocks(CHANNELS_BLOCK, CHANNELS_COUNT)
+            first_channel = 1
+
+            if resume:
+
+                # verify already confirmed channels, writing continues from the first one which doesn't match
+                first_channel = confirmed+1
+                for channel_number in range(1, confirmed+1):
+                    offset = (channel_number-1)*EEPROM_BLOCK_SIZE
+                    if current_bytes[offset:offset+EEPROM_BLOCK_SIZE] != target_bytes[offset:offset+EEPROM_BLOCK_SIZE]:
+                        first_channel = channel_number
+                        break
+
+                skipped = first_channel-1
+                last_channel = first_channel-1
+
+                if progress:
+                    progress("resuming import from CH-{:03d}.".format(first_channel))
+
+            # for each channel number in radio...
+            for channel_number in range(first_channel,CHANNELS_COUNT+1):
+
+                # show writing progress
+                if progress and (channel_number)%11 == 0:
+                    progress("importing CH-{:03d}...CH-{:03d} ({:3.0f})%.".format(channel_number-10,channel_number,channel_number/198*100))
+
+                offset = (channel_number-1)*EEPROM_BLOCK_SIZE
+                data_w = target_bytes[offset:offset+EEPROM_BLOCK_SIZE]
+
+                if debug:
+                    print("data_w: {}",format(data_w))
+
+                # skip channels which are already stored in radio
+                if current_bytes[offset:offset+EEPROM_BLOCK_SIZE] == data_w:
+                    skipped += 1
+                else:
+                    write_channel_bytes(radio, channel_number, data_w)
+                    written += 1
+
+                last_channel = channel_number
+
+                if journal is not None and channel_number % JOURNAL_INTERVAL == 0:
+                    if not save_journal(journal, target_hash, channel_number):
+                        journal = None
+
+    except NicFWError as e:
+        if journal is not None and save_journal(journal, target_hash, last_channel):
+            raise NicFWError("{}\n[INF] import progress saved to '{}', run import again with --resume to continue.".format(e, journal))
+        raise
+
+    if journal is not None:
+        try:
+            os.remove(journal)
+        except OSError:
+            pass
+
+    return written, skipped
+
+# open file for CSV import/export, '-' is stdin/stdout
+def open_csv_file(file, mode):
+
+    if file == "-":
+        stream = sys.stdout if mode == "w" else sys.stdin
+        return open(stream.fileno(), mode, newline='', closefd=False)
+
+    try:
+        return open(file, mode, newline='')
+    except OSError:
+        if mode == "w":
+            raise NicFWError("Could not open/write file '{}'".format(file))
+        raise NicFWError("Could not open/read file '{}'".format(file))
+
+# export all channels from radio to CSV file ('-' for stdout)
+# - every channel row is written as soon as its block is read
+def export_csv(radio, file, fixed_width=False, progress=print):
+
+    if fixed_width == False:
+        header = [ "Channel number", "Name", "Rx frequency", "Tx frequency", "Rx subtone", "Tx subtone", "Tx power", "Groups", "Bandwidth", "Modulation" ]
+        field_formats = [ "{:d}", "{:s}", "{:d}", "{:d}", "{:d}", "{:d}", "{:d}", "{:s}", "{:s}", "{:s}" ]
+    else:
+        header = [ "CH#", "Name        ", "  Rx freq", "  Tx freq", "RxSub", "TxSub", "PWR", "Grp ", "Bwidth", "Modulation" ]
+        field_formats = [ "{:03d}", "{:12s}", "{:9d}", "{:9d}", "{:5d}", "{:5d}", "{:3d}", "{:4s}", "{:6s}", "{:4s}" ]
+
+    try:
+        with open_csv_file(file, "w") as f:
+
+            writer = csv.writer(f, lineterminator="\n")
+
+            # write file header
+            writer.writerow(header)
+
+            for address, data in radio.iter_eeprom_blocks(range(CHANNELS_BLOCK, CHANNELS_BLOCK+CHANNELS_COUNT)):
+
+                channel_number = address-CHANNELS_BLOCK+1
+
+                # show reading progress
+                if progress and (channel_number)%11 == 0:
+                    progress("exporting CH-{:03d}...CH-{:03d} ({:3.0f})%.".format(channel_number-10,channel_number,channel_number/198*100))
+
+                with radio.stats.phase('decode'):
+                    ch = Channel.from_bytes(channel_number, data)
+
+                # write to file only valid channels
+                if ch is not None:
+                    values = [ ch.number, ch.name, ch.rx_f, ch.tx_f, ch.rx_subtone, ch.tx_subtone, ch.tx_power, ch.groups_str, ch.bandwidth_str, ch.modulation_str ]
+                    with radio.stats.phase('file'):
+                        writer.writerow([ fmt.format(value) for fmt, value in zip(field_formats, values) ])
+    except OSError:
+        if file == "-":
+            raise
+        raise NicFWError("Could not open/write file '{}'".format(file))
+
+# read channels from CSV file ('-' for stdin), yields Channel for every line
+def iter_csv_channels(file_name):
+
+    with open_csv_file(file_name, "r") as file:
+
+        reader = csv.reader(file)
+
+        for csv_data in reader:
+
+            lcount = reader.line_num
+
+            # skip first line (header) and empty lines
+            if lcount == 1 or len(csv_data) == 0:
+                continue
+
+            # check array size
+            if len(csv_data) != 10:
+                raise NicFWError("line {} has incorrect number of fields".format(lcount))
+
+            # check and import channel settings
+            try:
+                ch = Channel(check_channel_number(csv_data[0].strip(' ')),
+                    name=check_name(csv_data[1].rstrip(' ')),
+                    rx_f=check_frequency(csv_data[2].strip(' ')),
+                    tx_f=check_frequency(csv_data[3].strip(' ')),
+                    rx_subtone=check_subtone(csv_data[4].strip(' ')),
+                    tx_subtone=check_subtone(csv_data[5].strip(' ')),
+                    tx_power=check_power(csv_data[6].strip(' ')))
+                ch.groups_str = check_groups(csv_data[7].strip(' '))
+                ch.bandwidth_str = check_bandwidth(csv_data[8].strip(' '))
+                ch.modulation_str = check_modulation(csv_data[9].strip(' '))
+            except NicFWError as e:
+                raise NicFWError("{}\n[ERR] import failed on line {}".format(e,lcount))
+
+            if debug:
+                print ("[DBG] file read: {} {} {} {} {} {} {} {} {} {}".format(ch.number,ch.name,ch.rx_f,ch.tx_f,ch.rx_subtone,ch.tx_subtone,ch.tx_power,ch.groups_str,ch.bandwidth_str,ch.modulation_str), file=sys.stderr)
+
+            yield ch
+
+# read channels from CSV file, returns dict (channel number: Channel)
+def read_csv(file_name):
+
+    # dictionary where channels data readed from file will be stored
+    ChannelsDict = {}
+
+    for ch in iter_csv_channels(file_name):
+
+        # check for duplicates
+        if ch.number in ChannelsDict.keys():
+            raise NicFWError("duplicated channel number: {}".format(ch.number))
+
+        ChannelsDict[ch.number] = ch
+
+    return ChannelsDict
+
+
+######################################################################################
+# CHANNEL INDEX
+######################################################################################
+# channels are read once (single bulk read or image file) and indexed in memory,
+# queries are answered without any further radio I/O
+
+FIND_KEYS = [ 'freq', 'group', 'name', 'mod' ]
+
+# parse find query, comma separated key=value conditions (all of them have to match):
+# - freq=FROM-TO or freq=FREQ -- RX frequency in 10Hz units
+# - group=LETTERS -- member of any of groups
+# - name=PREFIX -- name starts with prefix (case insensitive)
+# - mod=MODULATION
+# returns list of (key, value)
+def parse_find_query(query):
+
+    conditions = []
+
+    for item in query.split(","):
+
+        item = item.strip()
+        if item == "":
+            continue
+
+        key, sep, value = item.partition("=")
+        key = key.strip().lower()
+        value = value.strip()
+
+        if sep == "" or key not in FIND_KEYS:
+            raise NicFWError("wrong find condition '{}', allowed: {}".format(item, ', '.join(k+"=..." for k in FIND_KEYS)))
+
+        if key == 'freq':
+            low, sep, high = value.partition("-")
+            low = check_frequency(low)
+            high = check_frequency(high) if sep else low
+            if low > high:
+                raise NicFWError("wrong frequency range '{}'.".format(value))
+            value = (low, high)
+
+        elif key == 'group':
+            value = value.upper()
+            if value == "" or any(group_a2i(group) == 0 for group in value):
+                raise NicFWError("wrong group '{}', allowed letters: A-O.".format(value))
+
+        elif key == 'name':
+            value = value.upper()
+
+        elif key == 'mod':
+            value = check_str_in_array(value, MODULATIONS, "modulation")
+
+        conditions.append((key, value))
+
+    return conditions
+
+# in-memory index of channel table, sets of channels are bitmaps (bit i is channel i+1)
+# - frequencies: (RX frequency, index) sorted for range queries
+# - names: (upper case name, index) sorted for prefix lookup
+# - groups/modulations: bitmap of channels for every group letter/modulation
+class ChannelIndex:
+
+    def __init__(self, table):
+
+        self.table = table
+        self.all = 0
+        self.frequencies = []
+        self.names = []
+        self.groups = {}
+        self.modulations = {}
+
+        for i in range(len(table)):
+
+            if table.empty[i]:
+                continue
+
+            bit = 1 << i
+            self.all |= bit
+
+            self.frequencies.append((int(table.columns['rx_f'][i]), i))
+            self.names.append((table.name(i).upper(), i))
+
+            for group in group_b2an(int(table.columns['groups'][i]).to_bytes(2, 'little')):
+                if group > 0:
+                    letter = chr(group+64)
+                    self.groups[letter] = self.groups.get(letter, 0) | bit
+
+            modulation = (int(table.columns['mod_bw'][i]) >> 1) & 0b00000011
+            self.modulations[modulation] = self.modulations.get(modulation, 0) | bit
+
+        self.frequencies.sort()
+        self.names.sort()
+        self.frequency_keys = [ f for f, i in self.frequencies ]
+
+    # index all channels of radio (or image file) read in single pass
+    @classmethod
+    def from_radio(cls, radio):
+
+        buf = radio.read_eeprom_regions([ 'channels' ])['channels']
+
+        with radio.stats.phase('decode'):
+            return cls(ChannelTable.from_bytes(buf, use_numpy=True))
+
+    def by_frequency(self, low, high):
+
+        bits = 0
+        start = bisect.bisect_left(self.frequency_keys, low)
+        end = bisect.bisect_right(self.frequency_keys, high)
+
+        for f, i in self.frequencies[start:end]:
+            bits |= 1 << i
+
+        return bits
+
+    def by_name(self, prefix):
+
+        bits = 0
+
+        for name, i in self.names[bisect.bisect_left(self.names, (prefix,)):]:
+            if not name.startswith(prefix):
+                break
+            bits |= 1 << i
+
+        return bits
+
+    def by_groups(self, letters):
+
+        bits = 0
+
+        for letter in letters:
+            bits |= self.groups.get(letter, 0)
+
+        return bits
+
+    # channel numbers matching all conditions (see parse_find_query)
+    def find(self, conditions):
+
+        bits = self.all
+
+        for key, value in conditions:
+            if key == 'freq':
+                bits &= self.by_frequency(*value)
+            elif key == 'group':
+                bits &= self.by_groups(value)
+            elif key == 'name':
+                bits &= self.by_name(value)
+            elif key == 'mod':
+                bits &= self.modulations.get(value, 0)
+
+        return [ i+1 for i in range(len(self.table)) if (bits >> i) & 1 ]
+
+# channel summary in single line
+def channel_line(ch):
+    return "CH-{:03d} {:12s} {:>10d} {:>10d} {} {:4s} {}".format(ch.number, ch.name, ch.rx_f, ch.tx_f, ch.groups_str, ch.modulation_str, ch.bandwidth_str)
+
+# print found channels, one per line (prefixed with source, eg. image file name)
+def print_found_channels(index, numbers, source=None):
+
+    prefix = "{}: ".format(source) if source is not None else ""
+
+    for number in numbers:
+        print(prefix + channel_line(index.table.channel(number-1)))
+
+# find channels in radio (or image file)
+def find_channels(radio, query):
+
+    conditions = parse_find_query(query)
+    index = ChannelIndex.from_radio(radio)
+
+    print_found_channels(index, index.find(conditions))
+
+# find channels in every EEPROM image file stored in directory
+def find_in_images(directory, query):
+
+    conditions = parse_find_query(query)
+
+    images = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.path.getsize(path) == EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+            images.append(path)
+
+    if not images:
+        raise NicFWError("no EEPROM image files found in '{}'.".format(directory))
+
+    for path in images:
+        radio = Radio(image=path)
+        try:
+            index = ChannelIndex.from_radio(radio)
+        finally:
+            radio.close()
+        print_found_channels(index, index.find(conditions), os.path.basename(path))
+
+
+######################################################################################
+# EEPROM / SETTINGS
+######################################################################################
+
+# read and print specified chunk of blocks
+def print_eeprom_blocks(radio, start_address, end_address):
+
+    for address, data in radio.iter_eeprom_blocks(range(start_address,end_address)):
+        hex_string = "{:03d} ".format(address) + "0x" + struct.pack('B', address).hex() + " | "
+        hex_string += ' '.join(struct.pack('B', x).hex() for x in data)
+        print(hex_string)
+
+# save full EEPROM content to binary image file
+def backup_eeprom(radio, file, progress=print):
+
+    image = radio.read_eeprom_image(progress)
+
+    with radio.stats.phase('file'):
+
+        try:
+            with open(file,"wb") as f:
+                f.write(image)
+        except OSError:
+            raise NicFWError("Could not open/write file '{}'".format(file))
+
+# read binary image file, returns its content
+def read_image_file(file):
+
+    try:
+        with open(file, "rb") as f:
+            image = f.read()
+    except OSError:
+        raise NicFWError("Could not open/read image file '{}'".format(file))
+
+    if len(image) != EEPROM_BLOCKS*EEPROM_BLOCK_SIZE:
+        raise NicFWError("image file '{}' has wrong size ({} but should be {} bytes).".format(file,len(image),EEPROM_BLOCKS*EEPROM_BLOCK_SIZE))
+
+    return image
+
+# write binary image (previously saved with backup_eeprom) to radio
+# - only blocks which differ from current radio content are written
+# - returns number of written and skipped blocks
+def restore_eeprom(radio, image, progress=print):
+
+    written = 0
+    skipped = 0
+
+    with radio.session():
+
+        current = radio.read_eeprom_image(progress)
+
+        for address in range(0, EEPROM_BLOCKS):
+
+            offset = address*EEPROM_BLOCK_SIZE
+            data_w = image[offset:offset+EEPROM_BLOCK_SIZE]
+
+            if current[offset:offset+EEPROM_BLOCK_SIZE] == data_w:
+                skipped += 1
+                continue
+
+            radio.write_eeprom_block(address, data_w)
+            written += 1
+
+    return written, skipped
+
+# read back and compare all blocks written since last verification
+def verify_writes(radio, progress=print):
+
+    count = len(radio.written_blocks)
+
+    mismatched = radio.verify_written_blocks()
+
+    if mismatched:
+        raise NicFWError("verification failed, {} of {} written blocks don't match: {}".format(len(mismatched), count, ', '.join(str(a) for a in mismatched)))
+
+    if progress:
+        progress("verified {} written blocks.".format(count))
+
+
+BANDPLAN_ENTRIES = 20
+BANDPLAN_ENTRY_SIZE = 10
+BANDPLAN_HEADERS = [ "Band Plan", "Start Frequency End frequency Max Power Modulation Bandwidth Tx Allowed Wrap" ]
+
+# decode band plan entry (10 bytes)
+def decode_band_plan_entry(item):
+
+    bp = {}
+    bp['start_f']     = int.from_bytes(item[0:4], 'little')
+    bp['end_f']       = int.from_bytes(item[4:8], 'little')
+    bp['bandwidth']   = (item[9] &0b11100000) >> 5
+    bp['modulation']  = (item[9] &0b00011100) >> 2
+    bp['tx']          = (item[9] &0b00000010) >> 1
+    bp['wrap']        = (item[9] &0b00000001)
+    bp['power']       = item[8]
+
+    return bp
+
+# encode band plan entry to 10 bytes
+def encode_band_plan_entry(bp):
+
+    flags = (bp['bandwidth'] << 5) | (bp['modulation'] << 2) | (bp['tx'] << 1) | bp['wrap']
+
+    return bp['start_f'].to_bytes(4, 'little') + bp['end_f'].to_bytes(4, 'little') + bytes([bp['power'], flags])
+
+# decode and prints bandplan
+def decode_band_plan(buf):
+
+    print("Band Plan")
+    print("{:15s} {:13s} {:09s} {:12s} {:14s} {:10s} {:9s}".format("Start Frequency",'End frequency','Max Power','Modulation','Bandwidth', 'Tx Allowed', 'Wrap'))
+
+    for i in range (0,BANDPLAN_ENTRIES):
+        bp = decode_band_plan_entry(buf[(i*BANDPLAN_ENTRY_SIZE):(i*BANDPLAN_ENTRY_SIZE+BANDPLAN_ENTRY_SIZE)])
+
+        print ("{:15d} {:13d} {:9d} {:12s} {:14s} {:10s} {:9s}".format(
+            bp['start_f'],
+            bp['end_f'],
+            bp['power'],
+            bandplan_mod[bp['modulation']],
+            bandplan_bw[bp['bandwidth']],
+            NoYes[bp['tx']],
+            NoYes[bp['wrap']]
+        ))
+
+
+FMTUNER_ENTRIES = 20
+FMTUNER_HEADERS = [ "FM Tuner settings", "Frequency Band" ]
+
+def decode_fmtuner(buf1, buf2):
+
+    print ("FM Tuner settings")
+    print ("{:9s} {:7s}".format("Frequency",'Band'))
+
+    for i in range (0,FMTUNER_ENTRIES):
+        freq_item = buf1[(i*4):(i*4+4)]
+        band_item = buf2[i]
+
+        print ("{:9d} {:7s}".format(
+            int.from_bytes(freq_item[0:4], 'little'),
+            fm_band[band_item],
+        ))
+
+# encode FM tuner entries, returns frequencies and bands regions data
+def encode_fmtuner(entries):
+
+    freq_bytes = b''.join(fm['freq'].to_bytes(4, 'little') for fm in entries)
+    band_bytes = bytes(fm['band'] for fm in entries)
+
+    return freq_bytes, band_bytes
+
+
+SCAN_PRESETS_ENTRIES = 10
+SCAN_PRESET_SIZE = 14
+SCAN_PRESETS_HEADERS = [ "Scan Presets", "Start Frequency End Frequency Squelch Squelch Tail Step Scan Hold Scan Tail Update Modulation" ]
+
+# decode scan preset entry (14 bytes)
+def decode_scan_preset_entry(sp_item):
+
+    sp = {}
+    sp['start_freq']  = int.from_bytes(sp_item[0:4], 'little')      # 4 bytes for frequency
+    sp['steps']  = int.from_bytes(sp_item[4:6], 'little')           # 2 bytes for scan steps
+    sp['squelch'] = sp_item[6] + 1; # +1 because squelch can be 1-9 (so 0-9 in byte)
+    sp['squelch_tail'] = sp_item[7]
+    sp['step']  = int.from_bytes(sp_item[8:10], 'little')
+    sp['scan_hold'] = sp_item[10]
+    sp['scan_tail'] = sp_item[11]
+    sp['update'] = sp_item[12]
+    sp['modulation'] = sp_item[13]
+
+    sp['end_freq'] = sp['start_freq'] + (sp['steps'] * sp['step'])
+
+    return sp
+
+# encode scan preset entry to 14 bytes
+def encode_scan_preset_entry(sp):
+
+    return (sp['start_freq'].to_bytes(4, 'little') + sp['steps'].to_bytes(2, 'little') +
+        bytes([sp['squelch']-1, sp['squelch_tail']]) + sp['step'].to_bytes(2, 'little') +
+        bytes([sp['scan_hold'], sp['scan_tail'], sp['update'], sp['modulation']]))
+
+def decode_scan_presets(buf):
+
+    print ("Scan Presets")
+    print ("{:15s} {:13s} {:7s} {:12s} {:5s} {:9s} {:9s} {:6s} {:10s}".format("Start Frequency",'End Frequency','Squelch','Squelch Tail','Step','Scan Hold','Scan Tail','Update','Modulation'))
+
+    for i in range (0,SCAN_PRESETS_ENTRIES):
+        sp = decode_scan_preset_entry(buf[(i*SCAN_PRESET_SIZE):(i*SCAN_PRESET_SIZE+SCAN_PRESET_SIZE)])
+
+        print ("{:15d} {:13d} {:7d} {:12d} {:5} {:9d} {:9d} {:6d} {:10s}".format(
+            sp['start_freq'],
+            sp['end_freq'],
+            sp['squelch'],
+            sp['squelch_tail'],
+            sp['step'],
+            sp['scan_hold'],
+            sp['scan_tail'],
+            sp['update'],
+            sp_mod[sp['modulation']],
+        ))
+
+
+# settings shown by show_settings and EEPROM_LAYOUT regions they need
+SETTINGS_REGIONS = {
+    'bandplan'      : [ 'bandplan' ],
+    'fmtuner'       : [ 'fmtuner_freq', 'fmtuner_band' ],
+    'scan_presets'  : [ 'scan_presets' ],
+}
+
+# read and print settings (list of SETTINGS_REGIONS names), all needed blocks are read in one pass
+def show_settings(radio, settings):
+
+    names = []
+    for setting in settings:
+        names += SETTINGS_REGIONS[setting]
+
+    regions = radio.read_eeprom_regions(names)
+
+    if debug:
+        for name in names:
+            print("{}:".format(name),' '.join(struct.pack('B', x).hex() for x in regions[name]))
+
+    for i, setting in enumerate(settings):
+
+        if i > 0:
+            print()
+
+        with radio.stats.phase('decode'):
+            show_setting(setting, regions)
+
+# decode and print single setting from regions data
+def show_setting(setting, regions):
+
+    if setting == 'bandplan':
+        decode_band_plan(regions['bandplan'])
+    elif setting == 'fmtuner':
+        decode_fmtuner(regions['fmtuner_freq'], regions['fmtuner_band'])
+    elif setting == 'scan_presets':
+        decode_scan_presets(regions['scan_presets'])
+
+# read and print Band Plan
+def show_bandplan(radio):
+    show_settings(radio, [ 'bandplan' ])
+
+# read and print FM tuner channels
+def show_fmtuner(radio):
+    show_settings(radio, [ 'fmtuner' ])
+
+# read and print Scan Presets
+def show_scan_presets(radio):
+    show_settings(radio, [ 'scan_presets' ])
+
+
+# read settings table file (the same format as --show-* output), yields (line number, fields) for every entry
+# - title and column header (headers, compared case insensitive without extra whitespace) and empty
+#   lines are skipped, any other line is entry (and validated as such by caller)
+def iter_table_file(file_name, fields_count, max_entries, desc, headers):
+
+    header_lines = [ header.lower().split() for header in headers ]
+
+    try:
+        file = open(file_name, "r")
+    except OSError:
+        raise NicFWError("Could not open/read file '{}'".format(file_name))
+
+    with file:
+
+        lcount = 0
+        entries = 0
+
+        for line in file:
+
+            lcount += 1
+
+            # split line data
+            line_data = re.findall(r'\S+',line)
+
+            # skip title, header and empty lines
+            if len(line_data) == 0 or [ field.lower() for field in line_data ] in header_lines:
+                continue
+
+            # check array size
+            if len(line_data) != fields_count:
+                raise NicFWError("line {} has incorrect number of fields".format(lcount))
+
+            if entries == max_entries:
+                raise NicFWError("line {}: {} can have up to {} entries".format(lcount, desc, max_entries))
+            entries += 1
+
+            yield lcount, line_data
+
+# validate number in range
+def check_range(desc, value, min_value, max_value):
+
+    number = conv2int(desc, value)
+
+    if number < min_value or number > max_value:
+        raise NicFWError("{} should be in the range from {} to {}.".format(desc, min_value, max_value))
+
+    return number
+
+# read and validate Band Plan file (the same format as --show-bandplan output), returns list of entries
+# - missing entries are filled with disabled (zero) ones
+def read_bandplan_file(file_name):
+
+    entries = []
+
+    for lcount, line_data in iter_table_file(file_name, 7, BANDPLAN_ENTRIES, "band plan", BANDPLAN_HEADERS):
+
+        # check and import bandplan entry
+        try:
+            bp = {}
+            bp['start_f']     = check_frequency(line_data[0],zero_allowed=True)
+            bp['end_f']       = check_frequency(line_data[1],zero_allowed=True)
+            bp['power']       = check_power(line_data[2])
+            bp['modulation']  = check_str_in_array(line_data[3],bandplan_mod,"Modulation")
+            bp['bandwidth']   = check_str_in_array(line_data[4],bandplan_bw,"Bandwidth")
+            bp['tx']          = check_str_in_array(line_data[5],NoYes,"TX allowed")
+            bp['wrap']        = check_str_in_array(line_data[6],NoYes,"Wrap")
+
+            if debug:
+                print ("[DBG] file read: {} {} {} {} {} {} {}".format(bp['start_f'],bp['end_f'],bp['power'],bp['modulation'],bp['bandwidth'],bp['tx'],bp['wrap']))
+
+            # check start freq < end frequency
+            if bp['start_f'] >= bp['end_f']:
+                if  bp['start_f'] != 0: # zero is allowed == bandplan entry disabled
+                    raise NicFWError("Start frequency should be smaller that End frequency")
+        except NicFWError as e:
+            raise NicFWError("{}\n[ERR] import failed on line {}".format(e,lcount))
+
+        entries.append(bp)
+
+    while len(entries) < BANDPLAN_ENTRIES:
+        entries.append(decode_band_plan_entry(bytes(BANDPLAN_ENTRY_SIZE)))
+
+    return entries
+
+# read and validate FM tuner file (the same format as --show-fmtuner output), returns list of entries
+# - missing entries are filled with zero frequency
+def read_fmtuner_file(file_name):
+
+    entries = []
+
+    for lcount, line_data in iter_table_file(file_name, 2, FMTUNER_ENTRIES, "FM tuner", FMTUNER_HEADERS):
+
+        try:
+            fm = {}
+            fm['freq'] = check_range("Frequency", line_data[0], 0, 0xFFFFFFFF)
+            fm['band'] = check_str_in_array(line_data[1],fm_band,"Band")
+
+            if debug:
+                print ("[DBG] file read: {} {}".format(fm['freq'],fm['band']))
+        except NicFWError as e:
+            raise NicFWError("{}\n[ERR] import failed on line {}".format(e,lcount))
+
+        entries.append(fm)
+
+    while len(entries) < FMTUNER_ENTRIES:
+        entries.append({ 'freq': 0, 'band': 0 })
+
+    return entries
+
+# read and validate Scan Presets file (the same format as --show-scan-presets output), returns list of entries
+# - end frequency is stored as number of steps, so (end - start) should be multiple of step
+# - missing entries are filled with zero ones
+def read_scan_presets_file(file_name):
+
+    entries = []
+
+    for lcount, line_data in iter_table_file(file_name, 9, SCAN_PRESETS_ENTRIES, "scan presets", SCAN_PRESETS_HEADERS):
+
+        try:
+            sp = {}
+            sp['start_freq']    = check_frequency(line_data[0],zero_allowed=True)
+            sp['end_freq']      = check_range("End frequency", line_data[1], 0, 0xFFFFFFFF)
+            sp['squelch']       = check_range("Squelch", line_data[2], 1, 10)
+            sp['squelch_tail']  = check_range("Squelch tail", line_data[3], 0, 255)
+            sp['step']          = check_range("Step", line_data[4], 0, 0xFFFF)
+            sp['scan_hold']     = check_range("Scan hold", line_data[5], 0, 255)
+            sp['scan_tail']     = check_range("Scan tail", line_data[6], 0, 255)
+            sp['update']        = check_range("Update", line_data[7], 0, 255)
+            sp['modulation']    = check_str_in_array(line_data[8],sp_mod,"Modulation")
+
+            if sp['end_freq'] < sp['start_freq']:
+                raise NicFWError("End frequency should not be smaller than Start frequency")
+
+            span = sp['end_freq'] - sp['start_freq']
+
+            if sp['step'] == 0:
+                if span != 0:
+                    raise NicFWError("Step can be 0 only if End frequency is equal to Start frequency")
+                sp['steps'] = 0
+            else:
+                if span % sp['step'] != 0:
+                    raise NicFWError("End - Start frequency ({}) should be multiple of Step ({})".format(span, sp['step']))
+                sp['steps'] = check_range("Number of steps", str(span // sp['step']), 0, 0xFFFF)
+
+            if debug:
+                print ("[DBG] file read: {}".format(sp))
+        except NicFWError as e:
+            raise NicFWError("{}\n[ERR] import failed on line {}".format(e,lcount))
+
+        entries.append(sp)
+
+    while len(entries) < SCAN_PRESETS_ENTRIES:
+        entries.append(decode_scan_preset_entry(bytes(SCAN_PRESET_SIZE)))
+
+    return entries
+
+# EEPROM regions (start byte, data) for settings entries
+def bandplan_regions(entries):
+    return [ (EEPROM_LAYOUT['bandplan'][0], b''.join(encode_band_plan_entry(bp) for bp in entries)) ]
+
+def fmtuner_regions(entries):
+    freq_bytes, band_bytes = encode_fmtuner(entries)
+    return [ (EEPROM_LAYOUT['fmtuner_freq'][0], freq_bytes), (EEPROM_LAYOUT['fmtuner_band'][0], band_bytes) ]
+
+def scan_presets_regions(entries):
+    return [ (EEPROM_LAYOUT['scan_presets'][0], b''.join(encode_scan_preset_entry(sp) for sp in entries)) ]
+
+
+######################################################################################
+# REMOTE CONTROL
+######################################################################################
+# 10 - MENU         0x0A
+# 11 - UP           0x0B
+# 12 - DOWN         0x0C
+# 13 - EXIT V/M     0x0D
+# 14 - *            0x0E
+# 15 - #            0x0F
+# 16 - PTT          0x10
+# 17 - FN1/PTT2     0x11
+# 18 - FN2/f-light  0x12
+
+# check if string can be converted to float (has only digits separated with optional '.')
+def is_float(string):
+    try:
+        float(string)
+        return True
+    except ValueError:
+        return False
+
+# convert coma separated key sequence to list of key codes
+def parse_keys(keys_str):
+
+    keys = keys_str.split(",")
+    keyArr = []
+    codes = []
+
+    # isolate numeric keys and put it to keyArr[] array (so 12345 will be [1, 2, 3, 4, 5] and will be send as separate keys
+    for key in keys:
+        if is_float(key):
+            for i in range(0,len(key)):
+                keyArr.append(key[i])
+        else:
+            keyArr.append(key)
+
+    for key in keyArr:
+        if key.lower() in [ 'blue', 'menu' ]:
+            key = 10
+        elif key.lower() == 'up':
+            key = 11
+        elif key.lower() == 'down':
+            key = 12
+        elif key.lower() in [ 'red', 'back' ]:
+            key = 13
+        elif key.lower() in [ '*', 'star', '.' ]:
+            key = 14
+        elif key.lower() == '#':
+            key = 15
+        elif key.lower() == 'ptt':
+            key = 16
+        elif key.lower() in [ 'f1', 'ptt2' ]:
+            key = 17
+        elif key.lower() == 'f2':
+            key = 18
+        elif len(key) == 1:
+            if ord(key) < ord('0') or ord(key) > ord('9'):
+               raise NicFWError("Unsupported key: '{}'".format(key))
+        else:
+            raise NicFWError("Unsupported key: '{}'".format(key))
+
+        codes.append(int(key))
+
+    return codes
+
+# parse key macro lines, returns list of steps:
+# - ('key', key code, hold time or None, release time or None) for key press
+# - ('wait', seconds) for pause
+#
+#   star                ; single key (the same names as for --key)
+#   1,4,4,9,5,0         ; coma separated key sequence
+#   down*3              ; key repeated 3 times
+#   ptt@2.5             ; key held for 2.5 s
+#   menu@0.1/1          ; key held for 0.1 s, then 1 s after release
+#   back@/0.2           ; default hold time, 0.2 s after release
+#   wait=1.5            ; pause for 1.5 s
+def parse_macro_steps(lines):
+
+    steps = []
+
+    for line in lines:
+
+        line = line.split(';',1)[0].strip() # ; starts comment (# is a key)
+        if line == "":
+            continue
+
+        if line.lower().startswith("wait="):
+            seconds = line[5:].strip()
+            if not is_float(seconds) or float(seconds) < 0:
+                raise NicFWError("wrong wait time '{}'".format(seconds))
+            steps.append(('wait', float(seconds)))
+            continue
+
+        for item in line.split(","):
+
+            item = item.strip()
+
+            hold = None
+            release = None
+            if "@" in item:
+                item, timing = item.rsplit("@",1)
+                hold, sep, release = timing.partition("/")
+                hold = check_key_time("hold", hold)
+                release = check_key_time("release", release)
+
+            repeat = 1
+            if "*" in item[1:]:
+                item, repeat = item.rsplit("*",1)
+                if not repeat.isnumeric() or int(repeat) < 1:
+                    raise NicFWError("wrong repeat count '{}'".format(repeat))
+                repeat = int(repeat)
+
+            for key in parse_keys(item) * repeat:
+                steps.append(('key', key, hold, release))
+
+    return steps
+
+# validate macro step hold/release time, returns None if it is not specified
+def check_key_time(desc, value):
+
+    value = value.strip()
+    if value == "":
+        return None
+
+    if not is_float(value) or float(value) < MIN_KEY_PUSH_TIME:
+        raise NicFWError("wrong {} time '{}', should be at least {} s".format(desc, value, MIN_KEY_PUSH_TIME))
+
+    return float(value)
+
+# read key macros file, returns dict (macro name: steps)
+# - every macro starts with [name] line followed by its steps
+def read_macro_file(file_name):
+
+    macros = {}
+    lines = None
+
+    try:
+        file = open(file_name, "r")
+    except OSError:
+        raise NicFWError("Could not open/read file '{}'".format(file_name))
+
+    with file:
+
+        lcount = 0
+
+        for line in file:
+
+            lcount += 1
+            stripped = line.strip()
+
+            if stripped.startswith("[") and stripped.endswith("]"):
+                name = stripped[1:-1].strip()
+                if name in macros:
+                    raise NicFWError("duplicated macro name '{}' on line {}".format(name, lcount))
+                lines = []
+                macros[name] = lines
+                continue
+
+            if lines is None:
+                if stripped == "" or stripped.startswith(";"):
+                    continue
+                raise NicFWError("macro step outside of [name] section on line {}".format(lcount))
+
+            lines.append((lcount, line))
+
+    result = {}
+
+    for name, lines in macros.items():
+        result[name] = []
+        for lcount, line in lines:
+            try:
+                result[name] += parse_macro_steps([line])
+            except NicFWError as e:
+                raise NicFWError("{}\n[ERR] macro '{}' failed on line {}".format(e, name, lcount))
+
+    return result
+
+# send key macro steps to radio in single remote session
+def run_macro(radio, steps, push_time=DEFAULT_KEY_PUSH_TIME):
+
+    if push_time < MIN_KEY_PUSH_TIME:
+        raise NicFWError("key time should be at least {} s.".format(MIN_KEY_PUSH_TIME))
+
+    with radio.remote_session():
+        for step in steps:
+            if step[0] == 'wait':
+                sleep(step[1])
+            else:
+                radio.send_key(step[1], push_time, step[2], step[3])
+
+# send coma separated key sequence to radio
+def send_keys(radio, keys_str, push_time=DEFAULT_KEY_PUSH_TIME):
+    run_macro(radio, [ ('key', key, None, None) for key in parse_keys(keys_str) ], push_time)
+
+
+######################################################################################
+# DAEMON
+######################################################################################
+
+# read exactly size bytes from client, returns less only if client disconnected
+def recv_exactly(sock, size):
+
+    data = b''
+
+    while len(data) < size:
+        chunk = sock.recv(size-len(data))
+        if chunk == b'':
+            break
+        data += chunk
+
+    return data
+
+# handles single client connection
+# - every request is sent to radio while holding server lock, so requests from many clients don't mix
+# - EEPROM reads are served from cache if possible, writes invalidate cached block
+#   (so written data can be read back from radio for verification)
+# - disable/enable requests are reference counted, so radio is enabled when last client session ends
+class DaemonHandler(socketserver.BaseRequestHandler):
+
+    # send request to radio and read its response
+    def radio_request(self, request, response_len):
+
+        port = self.server.radio.port
+        port.write(request)
+
+        if response_len == 0:
+            return b''
+
+        return port.read(response_len)
+
+    def handle(self):
+
+        server = self.server
+        cache = server.radio.block_cache
+
+        session_depth = 0   # sessions opened by this client
+
+        if debug:
+            print("[DBG] client connected")
+
+        try:
+            while True:
+
+                cmd = recv_exactly(self.request, 1)
+                if cmd == b'':
+                    break
+
+                cmd_args = recv_exactly(self.request, CMD_ARGS_LEN.get(cmd[0], 0))
+                if len(cmd_args) != CMD_ARGS_LEN.get(cmd[0], 0):
+                    break
+
+                with server.lock:
+
+                    if cmd == CMD_DISABLE_RADIO:
+                        if server.depth > 0:
+                            response = cmd
+                        else:
+                            response = self.radio_request(cmd, 1)
+                        if response == cmd:
+                            server.depth += 1
+                            session_depth += 1
+
+                    elif cmd == CMD_ENABLE_RADIO and session_depth > 0:
+                        response = cmd
+                        if server.depth == 1:
+                            response = self.radio_request(cmd, 1)
+                        server.depth -= 1
+                        session_depth -= 1
+
+                    elif cmd == CMD_READ_EEPROM:
+                        address = cmd_args[0]
+                        data = cache.get(address)
+                        if data is not None:
+                            response = cmd + data + calc_checksum(data)
+                        else:
+                            response = self.radio_request(cmd + cmd_args, CMD_RESPONSE_LEN[cmd[0]])
+                            data = response[1:EEPROM_BLOCK_SIZE+1]
+                            if response[0:1] == cmd and response[EEPROM_BLOCK_SIZE+1:] == calc_checksum(data):
+                                cache.put(address, data)
+
+                    elif cmd == CMD_WRITE_EEPROM:
+                        address = cmd_args[0]
+                        data = cmd_args[1:EEPROM_BLOCK_SIZE+1]
+                        response = self.radio_request(cmd + cmd_args, CMD_RESPONSE_LEN[cmd[0]])
+                        cache.invalidate(address)
+
+                    else:
+                        # keys can change radio settings stored in EEPROM
+                        if cmd[0] & 0x80:
+                            cache.clear()
+                        response = self.radio_request(cmd + cmd_args, CMD_RESPONSE_LEN.get(cmd[0], 0))
+
+                if response != b'':
+                    self.request.sendall(response)
+
+        except (OSError, NicFWError):
+            pass
+
+        finally:
+            # enable radio if client has not closed its sessions
+            with server.lock:
+                while session_depth > 0:
+                    server.depth -= 1
+                    session_depth -= 1
+                    if server.depth == 0:
+                        self.radio_request(CMD_ENABLE_RADIO, 1)
+
+        if debug:
+            print("[DBG] client disconnected")
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, radio):
+        self.radio = radio
+        self.lock = threading.Lock()    # serialises access to radio
+        self.depth = 0                  # number of clients' radio sessions (radio is disabled if > 0)
+        super().__init__(socket_path, DaemonHandler)
+
+# run daemon serving radio on unix socket
+def serve(radio):
+
+    socket_path = radio.socket_path
+
+    # remove stale socket file, refuse to start if another daemon is running
+    if os.path.exists(socket_path):
+        daemon_port = connect_daemon(socket_path)
+        if daemon_port is not None:
+            daemon_port.close()
+            raise NicFWError("daemon is already running at '{}'".format(socket_path))
+        os.remove(socket_path)
+
+    # open serial device now, to report problems before daemon starts
+    radio.open()
+
+    # socket is created accessible by current user only
+    umask = os.umask(0o177)
+    try:
+        server = DaemonServer(socket_path, radio)
+    except OSError:
+        raise NicFWError("Could not create socket '{}'".format(socket_path))
+    finally:
+        os.umask(umask)
+
+    print("nicFWutil daemon is listening on {} (Ctrl-C to stop)".format(socket_path))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+######################################################################################
+# FLEET
+######################################################################################
+# the same job is run on many radios at once, one worker thread per serial device
+
+# expand comma separated list of devices and/or glob patterns (eg. /dev/ttyUSB*)
+def expand_devices(devices_str):
+
+    devices = []
+
+    for pattern in devices_str.split(","):
+
+        pattern = pattern.strip()
+        if pattern == "":
+            continue
+
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise NicFWError("no device matches '{}'".format(pattern))
+        else:
+            matches = [ pattern ]
+
+        for device in matches:
+            if device not in devices:
+                devices.append(device)
+
+    if not devices:
+        raise NicFWError("no device specified for fleet.")
+
+    return devices
+
+# per-device file name: {} is replaced by device name, otherwise device name is added before extension
+def fleet_file_name(file_name, device):
+
+    name = os.path.basename(device)
+
+    if "{}" in file_name:
+        return file_name.format(name)
+
+    root, ext = os.path.splitext(file_name)
+
+    return "{}-{}{}".format(root, name, ext)
+
+# run job(radio, progress) on every device concurrently
+# - returns list of (device, result, error, time, statistics report) in devices order
+# - with trace, wire of every device is recorded to its own file (see fleet_file_name)
+def run_fleet(devices, job, window=DEFAULT_READ_WINDOW, trace=None):
+
+    print_lock = threading.Lock()
+
+    def worker(device):
+
+        name = os.path.basename(device)
+
+        def progress(message):
+            with print_lock:
+                print("[{}] {}".format(name, message))
+
+        start = time.monotonic()
+        radio = Radio(device=device, window=window, trace=fleet_file_name(trace, device) if trace is not None else None)
+        try:
+            result = job(radio, progress)
+            error = None
+        except NicFWError as e:
+            result = None
+            error = str(e)
+        finally:
+            radio.close()
+
+        return device, result, error, time.monotonic()-start, stats_report(radio, error)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        return list(executor.map(worker, devices))
+
+# print fleet results summary, returns number of failed devices
+def print_fleet_results(results, total_time):
+
+    failed = 0
+
+    print()
+    for device, result, error, elapsed, report in results:
+        if error is None:
+            print("{:20s} OK    {:7.2f}s  {}".format(device, elapsed, result))
+        else:
+            print("{:20s} FAIL  {:7.2f}s  {}".format(device, elapsed, error))
+            failed += 1
+
+    print("{} of {} radios done in {:.2f}s.".format(len(results)-failed, len(results), total_time))
+
+    return failed
+
+# run fleet action specified by command line args
+def run_fleet_action(args, window):
+
+    devices = expand_devices(args.fleet)
+
+    # import channels from CSV file (parsed once, shared by all workers)
+    if args.import_csv != None:
+
+        channels = read_csv(args.import_csv)
+
+        def job(radio, progress):
+            journal = import_journal_name(args.import_csv, radio.device)
+            written, skipped = write_channels_from_dict(radio, channels, progress, journal, args.resume)
+            if args.verify:
+                verify_writes(radio, progress)
+            if written > 0:
+                radio.reset_radio()
+            return "{} blocks written, {} unchanged blocks skipped".format(written, skipped)
+
+    # backup full EEPROM of each radio to its own image file
+    elif args.backup != None:
+
+        def job(radio, progress):
+            file_name = fleet_file_name(args.backup, radio.device)
+            backup_eeprom(radio, file_name, progress)
+            return "saved to {}".format(file_name)
+
+    # write the same image to all radios
+    elif args.restore != None:
+
+        image = read_image_file(args.restore)
+
+        def job(radio, progress):
+            written, skipped = restore_eeprom(radio, image, progress)
+            if args.verify:
+                verify_writes(radio, progress)
+            if written > 0:
+                radio.reset_radio()
+            return "{} blocks written, {} unchanged blocks skipped".format(written, skipped)
+
+    print("Running on {} radios: {}".format(len(devices), ', '.join(devices)))
+
+    start = time.monotonic()
+    results = run_fleet(devices, job, window, args.trace)
+
+    failed = print_fleet_results(results, time.monotonic()-start)
+
+    if save_stats(args, [ result[4] for result in results ]) == False:
+        failed += 1
+
+    return failed
+
+
+######################################################################################
+######################################################################################
+# MAIN
+######################################################################################
+######################################################################################
+
+def main():
+
+    global debug
+
+    # args
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--device", help="serial device to communicate with radio (default /dev/ttyUSB0)")
+    parser.add_argument("--image", help="read EEPROM from binary image file instead of radio (read only actions)")
+    parser.add_argument("-c", "--channel", help="channel number to edit/update/remove (update accepts list with ranges, eg. 1-50,60)")
+    parser.add_argument("-n", "--name", help="channel name")
+    parser.add_argument("-tx", "--tx", type=int, help="TX frequency")
+    parser.add_argument("-rx", "--rx", type=int, help="RX frequency")
+    parser.add_argument("-txc", "--tx-ctcss", type=int, help="TX CTCSS tone")
+    parser.add_argument("-rxc", "--rx-ctcss", type=int, help="RX CTCSS tone")
+    parser.add_argument("-p", "--power", type=int, help="TX power")
+    parser.add_argument("-m", "--modulation", help="modulation")
+    parser.add_argument("-b", "--bandwidth", help="bandwidth")
+    parser.add_argument("-g", "--groups", help="groups to add channel to (eg. ABCD, A00F)")
+    parser.add_argument("-r", "--reset", action='store_true', help="reset radio")
+    parser.add_argument("--remove", action='store_true', help="remove channel")
+    parser.add_argument("-u", "--update", action='store_true', help="update existing channel(s), given by --channel and/or --find")
+    parser.add_argument("-w", "--write", action='store_true', help="create new channel/overwrite existing one")
+    parser.add_argument("-f1", "--flashlight-on", action='store_true', help="turn flashlight ON")
+    parser.add_argument("-f0", "--flashlight-off", action='store_true', help="turn flashlight OFF")
+    parser.add_argument("-k", "--key", help="send KEY(s) sequence to radio")
+    parser.add_argument("--macro", help="run named key macro from macro file")
+    parser.add_argument("--macro-file", help="key macros file used by --macro")
+    parser.add_argument("--key-time", type=int, help="key press/release time in ms (default 330, min 50)")
+    parser.add_argument("-e", "--export-csv", help="export channels to CSV file")
+    parser.add_argument("-f", "--fixed-width", action='store_true', help="use fixed width data when exporting CSV")
+    parser.add_argument("-i", "--import-csv", help="import channels from CSV file")
+    parser.add_argument("--verify", action='store_true', help="read back and compare written blocks (write/update/remove/import/restore)")
+    parser.add_argument("--resume", action='store_true', help="continue interrupted CSV import (uses <CSV file>.journal)")
+    parser.add_argument("--find", help="find channels matching query (eg. 'freq=43000000-44000000,group=B,name=PMR,mod=FM')")
+    parser.add_argument("-se", "--show-eeprom", action='store_true', help="read and print eeprom content")
+    parser.add_argument("--backup", help="read full eeprom and save it to binary image file")
+    parser.add_argument("--restore", help="write binary image file to eeprom (only changed blocks)")
+    parser.add_argument("-sb", "--show-bandplan", action='store_true', help="read and show Band Plan")
+    parser.add_argument("-ib", "--import-bandplan", help="import bandplan from file")
+    parser.add_argument("-if", "--import-fmtuner", help="import FM Tuner channels from file")
+    parser.add_argument("-isp", "--import-scan-presets", help="import Scan Presets from file")
+    parser.add_argument("-sf", "--show-fmtuner", action='store_true', help="read and show FM Tunner channels")
+    parser.add_argument("-ss", "--show-settings", action='store_true', help="read and show all settings (Band Plan, FM Tunner, Scan Presets)")
+    parser.add_argument("-ssp", "--show-scan-presets", action='store_true', help="read and show Scan Presets")
+    parser.add_argument("--serve", action='store_true', help="run daemon holding serial device open, other nicFWutil calls will use it")
+    parser.add_argument("--socket", help="daemon socket path (default /tmp/nicFWutil-<device name>.sock)")
+    parser.add_argument("--fleet", help="run import/backup/restore on many radios at once (comma separated devices or glob, eg. '/dev/ttyUSB*')")
+    parser.add_argument("--window", type=int, help="number of EEPROM read requests kept in flight (default 1, no pipelining)")
+    parser.add_argument("--trace", help="record all bytes sent to/received from radio to binary trace file")
+    parser.add_argument("--replay", help="use recorded trace file instead of radio")
+    parser.add_argument("--replay-timing", action='store_true', help="replay trace with recorded radio response times")
+    parser.add_argument("--show-trace", help="print trace file in human readable form")
+    parser.add_argument("--stats", action='store_true', help="print I/O statistics (phases time, bytes, blocks, errors) to stderr")
+    parser.add_argument("--stats-json", help="save I/O statistics to JSON file ('-' for stdout)")
+    parser.add_argument("--debug", action='store_true', help="enable debug messages")
+    args = parser.parse_args()
+
+    debug = args.debug
+
+    # check for no args
+    if not any(vars(args).values()):
+        parser.print_help()
+        sys.exit(2)
+
+    # count specified channel actions
+    action_count = 0
+    for i in (args.write, args.update, args.remove):
+        if i == True:
+            action_count += 1
+
+    # count specified modifiers
+    modifiers_count = 0
+    for i in (args.name, args.power, args.tx_ctcss, args.rx_ctcss, args.rx, args.tx, args.modulation, args.bandwidth, args.groups):
+        if i != None:
+            modifiers_count += 1
+
+    # check for multiple channel actions at once
+    if action_count > 1:
+        print("[ERR] choose only one action from [write/update/remove].")
+        sys.exit(2)
+
+    # check if modifiers is used with remove channel action
+    if args.remove != False and modifiers_count > 0:
+        print("[ERR] channel modifiers can't be used with channel remove action.")
+        sys.exit(2)
+
+    # check if at least one modifier is used with update channel action
+    if args.update != False and modifiers_count == 0:
+        print("[ERR] Update channel action need at least one channel modifier.")
+        sys.exit(2)
+
+    # check for modifiers used without proper channel action
+    if modifiers_count > 0 and args.update == False and args.write == False:
+        print("[ERR] channel modifiers used without channel action.")
+        sys.exit(2)
+
+    # check for channel modifiers used with import/export action
+    if modifiers_count > 0 and (args.export_csv != None or args.import_csv != None):
+        print("[ERR] channel modifiers used without import/export action.")
+        sys.exit(2)
+
+    # check for using fixed width data without export action
+    if args.fixed_width != False and args.export_csv == None:
+        print("[ERR] fixed width data  modifier used without export action.")
+        sys.exit(2)
+
+    # check for using verify without write action
+    if args.verify != False and args.write == False and args.update == False and args.remove == False and args.import_csv == None and args.restore == None and args.import_bandplan == None and args.import_fmtuner == None and args.import_scan_presets == None:
+        print("[ERR] verify modifier used without write/update/remove/import/restore action.")
+        sys.exit(2)
+
+    # check key macro options
+    if (args.macro == None) != (args.macro_file == None):
+        print("[ERR] macro and macro file should be used together.")
+        sys.exit(2)
+
+    if args.macro != None and args.key != None:
+        print("[ERR] key sequence and macro used at once.")
+        sys.exit(2)
+
+    if args.key_time != None:
+        if args.key == None and args.macro == None:
+            print("[ERR] key time modifier used without key/macro action.")
+            sys.exit(2)
+        if args.key_time < MIN_KEY_PUSH_TIME*1000:
+            print("[ERR] key time should be at least {} ms.".format(int(MIN_KEY_PUSH_TIME*1000)))
+            sys.exit(2)
+
+    # check for using resume without import action
+    if args.resume != False and args.import_csv == None:
+        print("[ERR] resume modifier used without import action.")
+        sys.exit(2)
+
+    # there is no journal for stdin import
+    if args.resume != False and args.import_csv == "-":
+        print("[ERR] resume can't be used with import from stdin.")
+        sys.exit(2)
+
+    # check for using import and export action at once
+    if args.import_csv != None and args.export_csv != None:
+        print("[ERR] import and export action used at once.")
+        sys.exit(2)
+
+    # CSV and JSON can't share stdout
+    if args.stats_json == "-" and args.export_csv == "-":
+        print("[ERR] statistics JSON and exported CSV can't be both written to stdout.")
+        sys.exit(2)
+
+    # require channel number for channel actions
+    if args.channel == None:
+        if args.write != False or (args.update != False and args.find == None) or args.remove != False:
+            print("[ERR] channel number has been not specified.");
+            sys.exit(2)
+
+    # check for actions which need connected radio used with image file
+    if args.image != None:
+        for i in (args.write, args.update, args.remove, args.import_csv, args.import_bandplan, args.import_fmtuner, args.import_scan_presets, args.restore, args.reset, args.flashlight_on, args.flashlight_off, args.key, args.macro, args.serve):
+            if i != None and i != False:
+                print("[ERR] only read actions can be used with image file.")
+                sys.exit(2)
+
+    # check for using find with any other action (but update of found channels)
+    if args.find != None:
+        for i in (args.write, args.remove, args.export_csv, args.import_csv, args.import_bandplan, args.import_fmtuner, args.import_scan_presets, args.reset,
+                  args.flashlight_on, args.flashlight_off, args.key, args.macro, args.show_eeprom, args.backup, args.restore, args.show_bandplan, args.show_fmtuner, args.show_scan_presets, args.show_settings):
+            if i != None and i != False:
+                print("[ERR] find can't be used together with other actions.")
+                sys.exit(2)
+        if args.channel != None and args.update == False:
+            print("[ERR] channel number can be used with find only for update action.")
+            sys.exit(2)
+
+    # directory of image files can be only searched
+    if args.image != None and os.path.isdir(args.image) and args.find == None:
+        print("[ERR] image directory can be used only with find action.")
+        sys.exit(2)
+
+    # check for using daemon with any other action
+    if args.serve != False:
+        for i in (args.channel, args.write, args.update, args.remove, args.export_csv, args.import_csv, args.import_bandplan, args.import_fmtuner, args.import_scan_presets, args.reset,
+                  args.flashlight_on, args.flashlight_off, args.key, args.macro, args.show_eeprom, args.backup, args.restore, args.show_bandplan, args.show_fmtuner, args.show_scan_presets, args.show_settings, args.find):
+            if i != None and i != False:
+                print("[ERR] daemon can't be used together with other actions.")
+                sys.exit(2)
+
+    # check trace options
+    if args.trace != None or args.replay != None:
+        if args.image != None:
+            print("[ERR] trace can't be used with image file.")
+            sys.exit(2)
+        if args.trace != None and args.replay != None:
+            print("[ERR] trace and replay used at once.")
+            sys.exit(2)
+
+    if args.replay != None and (args.device != None or args.fleet != None or args.serve != False):
+        print("[ERR] replay can't be used together with device, fleet or daemon.")
+        sys.exit(2)
+
+    if args.replay_timing != False and args.replay == None:
+        print("[ERR] replay timing modifier used without replay.")
+        sys.exit(2)
+
+    # check fleet mode actions, exactly one of import/backup/restore is allowed
+    if args.fleet != None:
+        if args.device != None or args.image != None:
+            print("[ERR] fleet can't be used together with device or image file.")
+            sys.exit(2)
+        for i in (args.channel, args.write, args.update, args.remove, args.export_csv, args.import_bandplan, args.import_fmtuner, args.import_scan_presets, args.reset, args.serve,
+                  args.flashlight_on, args.flashlight_off, args.key, args.macro, args.show_eeprom, args.show_bandplan, args.show_fmtuner, args.show_scan_presets, args.show_settings, args.find):
+            if i != None and i != False:
+                print("[ERR] only import/backup/restore actions can be used with fleet.")
+                sys.exit(2)
+        if [args.import_csv, args.backup, args.restore].count(None) != 2:
+            print("[ERR] choose exactly one action from [import-csv/backup/restore] for fleet.")
+            sys.exit(2)
+
+    read_window = args.window
+    if read_window is None:
+        read_window = DEFAULT_READ_WINDOW
+
+    # trace file doesn't need radio at all
+    if args.show_trace != None:
+        try:
+            print_trace(args.show_trace)
+        except NicFWError as e:
+            print("[ERR] {}".format(e))
+            sys.exit(2)
+        sys.exit(0)
+
+    # find channels in all images stored in directory
+    if args.find != None and args.image != None and os.path.isdir(args.image):
+        try:
+            find_in_images(args.image, args.find)
+        except NicFWError as e:
+            print("[ERR] {}".format(e))
+            sys.exit(2)
+        sys.exit(0)
+
+    # run the same action on many radios
+    if args.fleet != None:
+        try:
+            failed = run_fleet_action(args, read_window)
+        except NicFWError as e:
+            print("[ERR] {}".format(e))
+            sys.exit(2)
+        sys.exit(2 if failed else 0)
+
+    radio = None
+    error = None
+
+    try:
+        radio = Radio(device=args.device, image=args.image, socket_path=args.socket, window=read_window, use_daemon=not args.serve,
+                      trace=args.trace, replay=args.replay, replay_timing=args.replay_timing)
+        try:
+            run(radio, args)
+        finally:
+            radio.close()
+    except NicFWError as e:
+        error = str(e)
+
+    if error is not None:
+        print("[ERR] {}".format(error))
+
+    # statistics are reported for failed actions too
+    if radio is not None and save_stats(args, [ stats_report(radio, error) ]) == False:
+        sys.exit(2)
+
+    sys.exit(0 if error is None else 2)
+
+# print and/or save statistics reports (--stats, --stats-json), returns False on failure
+def save_stats(args, reports):
+
+    if args.stats:
+        print_stats(reports)
+
+    if args.stats_json != None:
+        try:
+            write_stats_json(reports, args.stats_json)
+        except NicFWError as e:
+            print("[ERR] {}".format(e))
+            return False
+
+    return True
+
+# run action specified by command line args
+def run(radio, args):
+
+    # run daemon
+    if args.serve:
+        serve(radio)
+        return
+
+    # check channel number, list of channels is allowed only for update
+    channel_numbers = None
+    if args.channel != None:
+        channel_numbers = parse_channel_list(args.channel)
+        if len(channel_numbers) > 1 and not args.update:
+            raise NicFWError("channel list can be used only with update action.")
+        channel_number = channel_numbers[0]
+
+    modifiers = {
+        'name': args.name,
+        'rx': args.rx,
+        'tx': args.tx,
+        'tx_ctcss': args.tx_ctcss,
+        'rx_ctcss': args.rx_ctcss,
+        'power': args.power,
+        'groups': args.groups,
+        'modulation': args.modulation,
+        'bandwidth': args.bandwidth,
+    }
+
+    # write/overwrite channel
+    if args.write:
+
+        with radio.session():
+            write_channel(radio, Channel.default(channel_number), **modifiers)
+
+        if args.verify:
+            verify_writes(radio)
+
+        # optional radio reset after channel write (only if -r)
+        if args.reset:
+            radio.disable_remote()
+            radio.reset_radio()
+
+        return
+
+    # remove channel
+    if args.remove:
+
+        print("Removing channel CH-{:03d}".format(channel_number))
+
+        remove_channel(radio, channel_number)
+
+        if args.verify:
+            verify_writes(radio)
+
+        print("Done.")
+
+        return
+
+    # update many channels (list, ranges, find query) in single radio session
+    if args.update and (args.find != None or len(channel_numbers) > 1):
+
+        channels, written, empty = update_channels(radio, channel_numbers, args.find, modifiers)
+
+        if args.verify:
+            verify_writes(radio)
+
+        print("done ({} channels updated, {} blocks written, {} empty channels skipped).".format(len(channels), written, empty))
+
+        # optional radio reset after channel write (only if -r)
+        if args.reset and written > 0:
+            radio.disable_remote()
+            radio.reset_radio()
+
+        return
+
+    # update channel
+    if args.update:
+
+        # read and write back channel in single radio session
+        with radio.session():
+
+            ch = get_channel(radio, channel_number)
+
+            if ch is not None:
+                write_channel(radio, ch, **modifiers)
+            else:
+                print("Channel {} is empty -- cannot perform an UPDATE action!".format(channel_number))
+                return
+
+        if args.verify:
+            verify_writes(radio)
+
+        # optional radio reset after channel write (only if -r)
+        if args.reset:
+            radio.disable_remote()
+            radio.reset_radio()
+
+        return
+
+    # print info about channel
+    if args.channel:
+
+        ch = get_channel(radio, channel_number)
+
+        if ch is not None:
+            print_channel(ch)
+        else:
+            print("Channel {} is empty.".format(channel_number))
+
+        return
+
+    # find channels matching query
+    if args.find != None:
+        find_channels(radio, args.find)
+        return
+
+    # turn flashlight on
+    if args.flashlight_on:
+        radio.flashlight(True)
+        return
+
+    # turn flashlight off
+    if args.flashlight_off:
+        radio.flashlight(False)
+        return
+
+    # reset radio
+    if args.reset:
+        radio.disable_remote()
+        radio.reset_radio()
+        return
+
+    # export all channels from radio to CSV file
+    if args.export_csv != None:
+
+        # keep stdout clean for CSV data
+        log_file = sys.stderr if args.export_csv == "-" else sys.stdout
+
+        export_csv(radio, args.export_csv, args.fixed_width, progress=lambda message: print(message, file=log_file))
+
+        print ("done.", file=log_file)
+
+        return
+
+    # import channels from CSV file
+    if args.import_csv != None:
+
+        with radio.stats.phase('file'):
+            ChannelsDict = read_csv(args.import_csv)
+
+        written, skipped = write_channels_from_dict(radio, ChannelsDict, journal=import_journal_name(args.import_csv), resume=args.resume)
+
+        if args.verify:
+            verify_writes(radio)
+
+        print ("done ({} blocks written, {} unchanged blocks skipped).".format(written,skipped))
+
+        # restart radio only if something has been changed
+        if written > 0:
+            radio.reset_radio()
+
+        return
+
+    # print EEPROM content
+    if args.show_eeprom != False:
+        print_eeprom_blocks(radio,0,255)
+        return
+
+    # backup full EEPROM to binary image file
+    if args.backup != None:
+
+        backup_eeprom(radio, args.backup)
+
+        print ("done.")
+
+        return
+
+    # write binary image file to EEPROM
+    if args.restore != None:
+
+        with radio.stats.phase('file'):
+            image = read_image_file(args.restore)
+
+        written, skipped = restore_eeprom(radio, image)
+
+        if args.verify:
+            verify_writes(radio)
+
+        print ("done ({} blocks written, {} unchanged blocks skipped).".format(written,skipped))
+
+        # restart radio only if something has been changed
+        if written > 0:
+            radio.reset_radio()
+
+        return
+
+    # print Band Plan, FM tuner channels and Scan Presets, all in single pass
+    settings = []
+    if args.show_bandplan != False or args.show_settings != False:
+        settings.append('bandplan')
+    if args.show_fmtuner != False or args.show_settings != False:
+        settings.append('fmtuner')
+    if args.show_scan_presets != False or args.show_settings != False:
+        settings.append('scan_presets')
+
+    if settings:
+        show_settings(radio, settings)
+        return
+
+    # import Band Plan, FM tuner and Scan Presets from files, all in single coalesced write
+    if args.import_bandplan != None or args.import_fmtuner != None or args.import_scan_presets != None:
+
+        regions = []
+
+        with radio.stats.phase('file'):
+
+            if args.import_bandplan != None:
+                regions += bandplan_regions(read_bandplan_file(args.import_bandplan))
+
+            if args.import_fmtuner != None:
+                regions += fmtuner_regions(read_fmtuner_file(args.import_fmtuner))
+
+            if args.import_scan_presets != None:
+                regions += scan_presets_regions(read_scan_presets_file(args.import_scan_presets))
+
+        written, skipped = radio.write_eeprom_regions(regions)
+
+        if args.verify:
+            verify_writes(radio)
+
+        print ("done ({} blocks written, {} unchanged blocks skipped).".format(written,skipped))
+
+        # restart radio only if something has been changed
+        if written > 0:
+            radio.reset_radio()
+
+        return
+
+    # key press/release time
+    push_time = DEFAULT_KEY_PUSH_TIME
+    if args.key_time != None:
+        push_time = args.key_time/1000
+
+    # send keys
+    if args.key:
+        send_keys(radio, args.key, push_time)
+        print("done.")
+        return
+
+    # run key macro from file
+    if args.macro != None:
+
+        with radio.stats.phase('file'):
+            macros = read_macro_file(args.macro_file)
+
+        if args.macro not in macros:
+            raise NicFWError("macro '{}' not found in '{}', available: {}".format(args.macro, args.macro_file, ', '.join(macros)))
+
+        run_macro(radio, macros[args.macro], push_time)
+        print("done.")
+        return
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # output closed by reader (eg. piped to head), drop the rest of output quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(2)